@@ -4,19 +4,26 @@
 """
 
 import os
+import gzip
 import json
+import math
 import uuid
+import hashlib
+import time
 from datetime import datetime
 from functools import wraps
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_from_directory
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_from_directory, g, Response, stream_with_context, make_response
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 import bcrypt
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json, execute_values
 
 from config import Config
+from db_pool import ManagedConnectionPool
+from cache_utils import TTLCache, TileCache, CompressedBodyBuilder, CompressedResponseCache, VersionedCache
+from network_graph import DuctNetwork
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -34,21 +41,35 @@ login_manager.login_message = 'Пожалуйста, войдите для до
 # DATABASE CONNECTION
 # ============================================
 
+db_pool = ManagedConnectionPool(
+    Config.DB_POOL_MIN_SIZE,
+    Config.DB_POOL_MAX_SIZE,
+    timeout=Config.DB_POOL_TIMEOUT,
+    healthcheck_interval=Config.DB_POOL_HEALTHCHECK_INTERVAL,
+    host=Config.DB_HOST,
+    port=Config.DB_PORT,
+    dbname=Config.DB_NAME,
+    user=Config.DB_USER,
+    password=Config.DB_PASSWORD
+)
+
 def get_db():
-    """Get database connection"""
-    conn = psycopg2.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        dbname=Config.DB_NAME,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD
-    )
-    return conn
+    """Get database connection for the current request (borrowed from the pool)"""
+    if 'db_conn' not in g:
+        g.db_conn = db_pool.getconn()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.putconn(conn)
 
 def init_db():
     """Initialize database with schema"""
+    conn = db_pool.getconn()
     try:
-        conn = get_db()
         cur = conn.cursor()
         
         # Read and execute schema
@@ -72,11 +93,12 @@ def init_db():
             print(f"Created default admin user: {Config.DEFAULT_ADMIN_LOGIN}")
         
         cur.close()
-        conn.close()
         print("Database initialized successfully")
     except Exception as e:
         print(f"Database initialization error: {e}")
         raise
+    finally:
+        db_pool.putconn(conn)
 
 # ============================================
 # USER MODEL
@@ -95,8 +117,41 @@ class User(UserMixin):
     def is_viewer(self):
         return self.role == 'viewer'
 
+# Cache of (data versions, User) keyed by id. Entries are only used while the
+# users/ref_roles versions are unchanged, so a deactivation or role change made
+# through any worker applies everywhere within USER_VERSION_CHECK_INTERVAL.
+user_cache = TTLCache(max_size=Config.USER_CACHE_MAX_SIZE, ttl=Config.USER_CACHE_TTL)
+USER_TABLES = ['users', 'ref_roles']
+user_versions = None  # users/ref_roles versions last read by this worker
+user_versions_checked_at = None  # monotonic time of that read
+
+def current_user_versions():
+    """users/ref_roles versions, re-read at most every USER_VERSION_CHECK_INTERVAL seconds per worker"""
+    global user_versions, user_versions_checked_at
+    
+    now = time.monotonic()
+    if user_versions_checked_at is None or now - user_versions_checked_at >= Config.USER_VERSION_CHECK_INTERVAL:
+        user_versions = tuple(sorted(get_data_versions(USER_TABLES).items()))
+        user_versions_checked_at = now
+    return user_versions
+
 @login_manager.user_loader
 def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    
+    try:
+        version = current_user_versions()
+    except Exception as e:
+        print(f"Error loading user: {e}")
+        return None
+    
+    entry = user_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    
     try:
         conn = get_db()
         cur = conn.cursor(cursor_factory=RealDictCursor)
@@ -108,10 +163,11 @@ def load_user(user_id):
         """, (user_id,))
         user_data = cur.fetchone()
         cur.close()
-        conn.close()
         
         if user_data:
-            return User(user_data['id'], user_data['username'], user_data['role_name'], user_data['full_name'])
+            user = User(user_data['id'], user_data['username'], user_data['role_name'], user_data['full_name'])
+            user_cache.set(user_id, (version, user))
+            return user
     except Exception as e:
         print(f"Error loading user: {e}")
     return None
@@ -154,6 +210,159 @@ def save_uploaded_file(file, object_type, object_id):
         }
     return None
 
+# ============================================
+# CONDITIONAL REQUESTS (ETag)
+# ============================================
+
+def get_data_versions(tables):
+    """
+    Get trigger-maintained change versions for tables
+    
+    Versions are read once per request, so the ETag and the reference
+    cache lookups made while building the response agree.
+    """
+    known = g.setdefault('data_versions', {})
+    missing = [table for table in tables if table not in known]
+    if missing:
+        cur = get_db().cursor()
+        cur.execute("SELECT table_name, version FROM data_versions WHERE table_name = ANY(%s)", (missing,))
+        versions = dict(cur.fetchall())
+        cur.close()
+        known.update((table, versions.get(table, 0)) for table in missing)
+    return {table: known[table] for table in tables}
+
+def compute_etag(tables):
+    """
+    ETag for the current request derived from the versions of the tables it reads
+    
+    Sent as a weak validator: the same tag covers the identity, gzip and
+    brotli bodies of a response, which are not byte-identical.
+    """
+    versions = get_data_versions(tables)
+    key = json.dumps([
+        request.path,
+        sorted(request.args.items(multi=True)),
+        sorted(versions.items())
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def etag_versioned(get_tables):
+    """
+    Answer GET requests with 304 when the client's ETag is current
+    
+    get_tables receives the view arguments and returns the tables the
+    response depends on (or None to skip). Versions are read before the
+    data, so a concurrent write can only make the ETag stale, never the body.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+            
+            tables = get_tables(**kwargs)
+            if not tables:
+                return f(*args, **kwargs)
+            
+            try:
+                etag = compute_etag(tables)
+            except Exception as e:
+                print(f"Error computing ETag: {e}")
+                return f(*args, **kwargs)
+            g.etag = etag
+            
+            # If-None-Match uses weak comparison
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            # Authenticated data: browsers may keep it but must revalidate each time
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+# ============================================
+# COMPRESSED RESPONSE CACHE
+# ============================================
+
+response_cache = CompressedResponseCache(Config.RESPONSE_CACHE_MAX_BYTES)
+
+def choose_encoding(entry):
+    """Pick the best content encoding the client accepts for a cache entry"""
+    if entry['br'] is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def cached_body_response(entry):
+    """Build a response from a cache entry in the client's preferred encoding"""
+    encoding = choose_encoding(entry)
+    if encoding:
+        body = entry[encoding]
+        response = Response(body, mimetype=entry['mimetype'])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        body = gzip.decompress(entry['gzip'])
+        response = Response(body, mimetype=entry['mimetype'])
+    response_cache.record_served(entry['size'], len(body))
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cache_while_streaming(chunks, builder, key, mimetype):
+    """Pass body chunks through while compressing them into the cache"""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        builder.feed(chunk)
+        yield chunk
+    entry = builder.finish()
+    if entry is not None:
+        entry['mimetype'] = mimetype
+        response_cache.put(key, entry)
+
+def response_cached(f):
+    """
+    Serve repeat GET responses from precompressed bodies
+    
+    Must be applied below etag_versioned: the cache key is the request's
+    ETag, which already covers the path, the arguments and the data versions.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = g.get('etag')
+        if request.method != 'GET' or key is None:
+            return f(*args, **kwargs)
+        
+        entry = response_cache.get(key)
+        if entry is not None:
+            return cached_body_response(entry)
+        
+        response = make_response(f(*args, **kwargs))
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        
+        builder = CompressedBodyBuilder(Config.RESPONSE_CACHE_MAX_ENTRY_BYTES, Config.RESPONSE_COMPRESSION_LEVEL)
+        if response.is_streamed:
+            # Keep streaming this response; later requests get the compressed copy
+            response.response = cache_while_streaming(response.response, builder, key, response.mimetype)
+            response.vary.add('Accept-Encoding')
+            return response
+        
+        builder.feed(response.get_data())
+        entry = builder.finish()
+        if entry is None:
+            return response
+        entry['mimetype'] = response.mimetype
+        response_cache.put(key, entry)
+        return cached_body_response(entry)
+    return decorated_function
+
 # ============================================
 # ROUTES - AUTH
 # ============================================
@@ -187,7 +396,6 @@ def login():
                 conn.commit()
                 
                 cur.close()
-                conn.close()
                 
                 flash('Вход выполнен успешно!', 'success')
                 return redirect(url_for('index'))
@@ -195,7 +403,6 @@ def login():
                 flash('Неверное имя пользователя или пароль', 'error')
             
             cur.close()
-            conn.close()
         except Exception as e:
             flash(f'Ошибка подключения к базе данных: {e}', 'error')
     
@@ -226,40 +433,175 @@ def map_view():
 # API - REFERENCES
 # ============================================
 
+REFERENCE_TABLES = {
+    'roles': 'ref_roles',
+    'object_kinds': 'ref_object_kinds',
+    'well_types': 'ref_well_types',
+    'channel_types': 'ref_channel_types',
+    'cable_types': 'ref_cable_types',
+    'marker_post_types': 'ref_marker_post_types',
+    'object_states': 'ref_object_states',
+    'owners': 'owners',
+    'contracts': 'contracts'
+}
+
+# Reference rows are loaded once per worker and reloaded when the
+# data_versions stamp of a source table changes
+reference_cache = VersionedCache()
+
+OWNERS_QUERY = "SELECT * FROM owners ORDER BY organization_name"
+CONTRACTS_QUERY = """
+    SELECT c.*, o.organization_name as owner_name
+    FROM contracts c
+    LEFT JOIN owners o ON c.owner_id = o.id
+    ORDER BY c.contract_date DESC
+"""
+
+def cached_reference(key, tables, query):
+    """
+    Rows of a reference query, served from the cache while the tables are unchanged
+    
+    The key names the query, not the table: different queries over the
+    same table need different keys.
+    """
+    version = tuple(sorted(get_data_versions(tables).items()))
+    
+    def load():
+        cur = get_db().cursor(cursor_factory=RealDictCursor)
+        cur.execute(query)
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    
+    return reference_cache.get(key, version, load)
+
+def reference_lookup(table, column):
+    """Map str(id) -> column value for a reference table, from the cache"""
+    version = get_data_versions([table])[table]
+    
+    def load():
+        if table == 'owners':
+            rows = cached_reference('owners_by_name', ['owners'], OWNERS_QUERY)
+        else:
+            rows = cached_reference(('ref', table), [table], f"SELECT * FROM {table} ORDER BY id")
+        return {str(row['id']): row[column] for row in rows}
+    
+    return reference_cache.get(('lookup', table, column), version, load)
+
+def invalidate_references():
+    """
+    Drop cached reference data after a write through this worker
+    
+    Other workers notice the change through the version stamps. Cached
+    tiles embed reference names and colors; they are keyed by the same
+    stamps (see tile_variant), so this only frees the outdated ones.
+    """
+    reference_cache.invalidate()
+    tile_cache.clear()
+
+def reference_tables(ref_type):
+    """Tables a reference response is built from"""
+    if ref_type not in REFERENCE_TABLES:
+        return None
+    return [REFERENCE_TABLES[ref_type]]
+
 @app.route('/api/references/<ref_type>')
 @login_required
+@etag_versioned(reference_tables)
 def get_references(ref_type):
     """Get reference data"""
-    table_map = {
-        'roles': 'ref_roles',
-        'object_kinds': 'ref_object_kinds',
-        'well_types': 'ref_well_types',
-        'channel_types': 'ref_channel_types',
-        'cable_types': 'ref_cable_types',
-        'marker_post_types': 'ref_marker_post_types',
-        'object_states': 'ref_object_states',
-        'owners': 'owners',
-        'contracts': 'contracts'
-    }
-    
-    if ref_type not in table_map:
+    if ref_type not in REFERENCE_TABLES:
         return jsonify({'error': 'Unknown reference type'}), 400
     
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(f"SELECT * FROM {table_map[ref_type]} ORDER BY id")
-        data = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify(data)
+        table = REFERENCE_TABLES[ref_type]
+        return jsonify(cached_reference(('ref', table), [table], f"SELECT * FROM {table} ORDER BY id"))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ============================================
+# COLUMNAR RESPONSES (format=columnar)
+# ============================================
+
+# Reference id column -> (table, {lookup attribute: table column})
+REFERENCE_COLUMNS = {
+    'owner_id': ('owners', {'name': 'organization_name'}),
+    'state_id': ('ref_object_states', {'name': 'name', 'color': 'color'}),
+    'well_type_id': ('ref_well_types', {'name': 'name'}),
+    'marker_type_id': ('ref_marker_post_types', {'name': 'name'}),
+    'cable_type_id': ('ref_cable_types', {'name': 'name'}),
+    'channel_type_id': ('ref_channel_types', {'name': 'name'}),
+    'contract_id': ('contracts', {'number': 'contract_number'})
+}
+
+GEOMETRY_COLUMNS = ('geometry', 'geom_wgs84', 'geom_msk86')
+
+def wants_columnar():
+    """Whether the request asked for the columnar format"""
+    return request.args.get('format') == 'columnar'
+
+def flatten_geometries(geometries):
+    """
+    Encode GeoJSON Points/LineStrings as one flat [x0, y0, x1, y1, ...] array
+    
+    Row i owns vertices offsets[i] to offsets[i + 1]; a row without
+    geometry has an empty range.
+    """
+    geom_type = None
+    coordinates = []
+    offsets = [0]
+    for geometry in geometries:
+        if geometry:
+            geom_type = geometry['type']
+            vertices = [geometry['coordinates']] if geom_type == 'Point' else geometry['coordinates']
+            for vertex in vertices:
+                coordinates.extend(vertex[:2])
+        offsets.append(len(coordinates) // 2)
+    return {'type': geom_type, 'coordinates': coordinates, 'offsets': offsets}
+
+def reference_dictionaries(columns):
+    """Lookup dictionaries for the reference id columns present, limited to the ids used"""
+    lookups = {}
+    for column, values in columns.items():
+        if column not in REFERENCE_COLUMNS:
+            continue
+        table, attributes = REFERENCE_COLUMNS[column]
+        maps = {name: reference_lookup(table, source) for name, source in attributes.items()}
+        lookups[column] = {
+            str(value): {name: values_map.get(str(value)) for name, values_map in maps.items()}
+            for value in set(values) if value is not None
+        }
+    return lookups
+
+def columnar_body(names, rows, **extra):
+    """
+    Build a columnar response body from row tuples
+    
+    Each column is one array, geometry columns are flattened and reference
+    ids are resolved once through the `lookups` dictionaries.
+    """
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+    geometries = {name: flatten_geometries(columns.pop(name)) for name in names if name in GEOMETRY_COLUMNS}
+    body = {
+        'format': 'columnar',
+        'count': len(rows),
+        'columns': columns,
+        'geometries': geometries,
+        'lookups': reference_dictionaries(columns)
+    }
+    body.update(extra)
+    return body
+
 # ============================================
 # API - MAP DATA
 # ============================================
 
+tile_cache = TileCache(
+    Config.TILE_CACHE_FOLDER,
+    max_zoom=Config.MAP_MAX_ZOOM,
+    buffer=Config.TILE_BUFFER / Config.TILE_EXTENT
+)
+
 @app.route('/api/map/layers')
 @login_required
 def get_map_layers():
@@ -274,144 +616,1219 @@ def get_map_layers():
     ]
     return jsonify(layers)
 
+# Layer id -> (table, type table, type FK column, geometry type)
+MAP_LAYERS = {
+    'wells': ('wells', 'ref_well_types', 'well_type_id', 'Point'),
+    'marker_posts': ('marker_posts', 'ref_marker_post_types', 'marker_type_id', 'Point'),
+    'channel_directions': ('channel_directions', None, None, 'LineString'),
+    'ground_cables': ('ground_cables', 'ref_cable_types', 'cable_type_id', 'LineString'),
+    'aerial_cables': ('aerial_cables', 'ref_cable_types', 'cable_type_id', 'LineString'),
+    'duct_cables': ('duct_cables', 'ref_cable_types', 'cable_type_id', 'LineString')
+}
+
+def get_geom_column(coord_system):
+    """Return (geometry column, SRID) for a coordinate system name"""
+    if coord_system == 'wgs84':
+        return 'geom_wgs84', Config.SRID_WGS84
+    return 'geom_msk86', Config.SRID_MSK86_ZONE4
+
+def parse_bbox(value):
+    """Parse 'minx,miny,maxx,maxy' into a tuple of floats"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError('bbox must be minx,miny,maxx,maxy')
+    return tuple(parts)
+
+def parse_zoom(value):
+    """Parse a web map zoom level"""
+    zoom = int(value)
+    if not 0 <= zoom <= Config.MAP_MAX_ZOOM:
+        raise ValueError(f'zoom must be between 0 and {Config.MAP_MAX_ZOOM}')
+    return zoom
+
+def pixel_size(zoom, coord_system):
+    """Approximate size of one screen pixel at a zoom level, in CRS units"""
+    if coord_system == 'wgs84':
+        return 360.0 / (256 * 2 ** zoom)
+    return 40075016.686 / (256 * 2 ** zoom)
+
+def layer_source(layer, style=None):
+    """
+    Return ([(attribute, SQL expression)], FROM clause, FROM parameters) for a map layer
+    
+    Type, state and owner names come from the reference cache as jsonb
+    id -> value maps bound to the alias `ref`, instead of joining the
+    reference tables for every feature. style='occupancy' colors channel
+    directions by channel fill.
+    """
+    table, type_table, type_fk, geom_type = MAP_LAYERS[layer]
+    lookups = {'owner_names': reference_lookup('owners', 'organization_name')}
+    
+    if type_table:
+        lookups['type_names'] = reference_lookup(type_table, 'name')
+        lookups['state_names'] = reference_lookup('ref_object_states', 'name')
+        lookups['state_colors'] = reference_lookup('ref_object_states', 'color')
+        attributes = [
+            ('type_name', f'ref.type_names ->> t.{type_fk}::text'),
+            ('state_name', 'ref.state_names ->> t.state_id::text'),
+            ('state_color', 'ref.state_colors ->> t.state_id::text'),
+            ('owner_name', 'ref.owner_names ->> t.owner_id::text')
+        ]
+    else:
+        attributes = [
+            ('type_name', 'NULL'),
+            ('state_name', 'NULL'),
+            ('state_color', "'#3498db'"),
+            ('owner_name', 'ref.owner_names ->> t.owner_id::text')
+        ]
+    
+    if style == 'occupancy' and layer == 'channel_directions':
+        report = occupancy_report()
+        lookups['fill_ratios'] = {str(row['direction_id']): row['fill_ratio'] for row in report}
+        lookups['fill_colors'] = {str(row['direction_id']): occupancy_color(row['fill_ratio']) for row in report}
+        attributes[2] = ('state_color', f"COALESCE(ref.fill_colors ->> t.id::text, '{OCCUPANCY_NO_CHANNELS_COLOR}')")
+        attributes.append(('fill_ratio', "(ref.fill_ratios ->> t.id::text)::float"))
+    
+    columns = ', '.join(f'%s::jsonb AS {name}' for name in lookups)
+    from_clause = f"{table} t CROSS JOIN (SELECT {columns}) ref"
+    return attributes, from_clause, [Json(values) for values in lookups.values()]
+
+def select_columns(attributes):
+    """Render attribute pairs as a SELECT list"""
+    return ', '.join(f"{expr} as {name}" for name, expr in attributes)
+
+def simplify_tolerance(zoom, coord_system):
+    """Line simplification tolerance for a zoom level, in CRS units"""
+    return pixel_size(zoom, coord_system) * Config.MAP_SIMPLIFY_PIXELS
+
+def coordinate_precision(zoom, coord_system):
+    """Number of decimal digits that keeps coordinates within half a pixel"""
+    digits = math.ceil(math.log10(2 / pixel_size(zoom, coord_system)))
+    return max(0, min(digits, Config.MAP_MAX_DECIMAL_DIGITS))
+
+def layer_conditions(layer, coord_system, bbox=None, zoom=None, ids=None):
+    """Build WHERE conditions and parameters for the visible features of a layer"""
+    geom_type = MAP_LAYERS[layer][3]
+    geom_col, srid = get_geom_column(coord_system)
+    
+    conditions = [f"t.{geom_col} IS NOT NULL"]
+    params = []
+    
+    if ids is not None:
+        conditions.append("t.id = ANY(%s)")
+        params.append(list(ids))
+    
+    if bbox:
+        # && is answered from the GIST index on the geometry column
+        conditions.append(f"t.{geom_col} && ST_MakeEnvelope(%s, %s, %s, %s, {srid})")
+        params.extend(bbox)
+    
+    if zoom is not None and geom_type == 'LineString':
+        # Lines shorter than a pixel at this zoom are not visible
+        conditions.append(f"""GREATEST(ST_XMax(t.{geom_col}) - ST_XMin(t.{geom_col}),
+                                       ST_YMax(t.{geom_col}) - ST_YMin(t.{geom_col})) >= %s""")
+        params.append(pixel_size(zoom, coord_system) * Config.MAP_MIN_LINE_PIXELS)
+    
+    return conditions, params
+
+def geometry_expression(layer, coord_system, zoom=None):
+    """Return (SQL expression, parameters) rendering a layer's geometry as GeoJSON"""
+    geom_type = MAP_LAYERS[layer][3]
+    geom_col, srid = get_geom_column(coord_system)
+    
+    if zoom is None:
+        return f"ST_AsGeoJSON(t.{geom_col})", []
+    if geom_type == 'LineString':
+        # Drop vertices and digits that cannot be seen at this zoom
+        return (f"ST_AsGeoJSON(ST_SimplifyPreserveTopology(t.{geom_col}, %s), %s)",
+                [simplify_tolerance(zoom, coord_system), coordinate_precision(zoom, coord_system)])
+    return f"ST_AsGeoJSON(t.{geom_col}, %s)", [coordinate_precision(zoom, coord_system)]
+
+def build_layer_query(layer, coord_system, bbox=None, zoom=None, limit=None, as_feature=False, ids=None,
+                      style=None):
+    """
+    Build SQL and parameters selecting the features of a map layer
+    
+    With as_feature=True each row is (id, text of the complete GeoJSON
+    Feature), assembled by PostgreSQL.
+    """
+    attributes, from_clause, from_params = layer_source(layer, style)
+    conditions, params = layer_conditions(layer, coord_system, bbox, zoom, ids)
+    geometry, select_params = geometry_expression(layer, coord_system, zoom)
+    
+    if as_feature:
+        properties = ', '.join(f"'{name}', {expr}" for name, expr in attributes)
+        select = f"""t.id, json_build_object(
+                'type', 'Feature',
+                'id', t.id,
+                'geometry', {geometry}::json,
+                'properties', json_build_object('id', t.id, 'number', t.number, 'layer', %s, {properties})
+            )::text as feature"""
+        select_params.append(layer)
+    else:
+        select = f"t.id, t.number, {geometry}::json as geometry, {select_columns(attributes)}"
+    
+    query = f"""
+        SELECT {select}
+        FROM {from_clause}
+        WHERE {' AND '.join(conditions)}
+    """
+    params = select_params + from_params + params
+    
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    
+    return query, params
+
+def build_cluster_query(layer, coord_system, zoom, bbox=None, limit=None):
+    """
+    Build SQL aggregating a point layer into grid clusters, one Feature per cell
+    
+    Each cluster carries the point count, its extent and the most common state color.
+    """
+    geom_col, srid = get_geom_column(coord_system)
+    table = MAP_LAYERS[layer][0]
+    conditions, params = layer_conditions(layer, coord_system, bbox, zoom)
+    cell_size = pixel_size(zoom, coord_system) * Config.MAP_CLUSTER_CELL_PIXELS
+    precision = coordinate_precision(zoom, coord_system)
+    
+    query = f"""
+        SELECT json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(c.center, %s)::json,
+            'properties', json_build_object(
+                'cluster', true,
+                'layer', %s,
+                'id', CASE WHEN c.point_count = 1 THEN c.min_id END,
+                'count', c.point_count,
+                'bbox', json_build_array(ST_XMin(c.extent), ST_YMin(c.extent),
+                                         ST_XMax(c.extent), ST_YMax(c.extent)),
+                'state_color', c.state_color
+            )
+        )::text as feature
+        FROM (
+            SELECT 
+                COUNT(*) as point_count,
+                MIN(t.id) as min_id,
+                ST_Centroid(ST_Collect(t.{geom_col})) as center,
+                ST_Extent(t.{geom_col}) as extent,
+                mode() WITHIN GROUP (ORDER BY ref.state_colors ->> t.state_id::text) as state_color
+            FROM {table} t CROSS JOIN (SELECT %s::jsonb AS state_colors) ref
+            WHERE {' AND '.join(conditions)}
+            GROUP BY ST_SnapToGrid(t.{geom_col}, %s)
+        ) c
+    """
+    state_colors = Json(reference_lookup('ref_object_states', 'color'))
+    params = [precision, layer, state_colors] + params + [cell_size]
+    
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    
+    return query, params
+
+def open_layer_cursor(conn, layer, coord_system, bbox=None, zoom=None):
+    """
+    Open a server-side cursor yielding a layer's GeoJSON Features as text
+    
+    Returns (cursor, clustered). Point layers are clustered below
+    MAP_CLUSTER_MAX_ZOOM unless the request has cluster=0; style=occupancy
+    colors channel directions by fill.
+    """
+    clustered = (MAP_LAYERS[layer][3] == 'Point' and zoom is not None
+                 and zoom < Config.MAP_CLUSTER_MAX_ZOOM and request.args.get('cluster') != '0')
+    
+    # Server-side cursor: rows are pulled from PostgreSQL while the response is written
+    cur = conn.cursor(name=f'geojson_{uuid.uuid4().hex}')
+    cur.itersize = Config.GEOJSON_STREAM_CHUNK_SIZE
+    
+    # Fetch one extra row to detect truncation
+    limit = Config.MAP_MAX_FEATURES + 1
+    if clustered:
+        query, params = build_cluster_query(layer, coord_system, zoom, bbox, limit=limit)
+    else:
+        query, params = build_layer_query(layer, coord_system, bbox, zoom, limit=limit, as_feature=True,
+                                          style=request.args.get('style'))
+    cur.execute(query, params)
+    
+    return cur, clustered
+
+def layer_columnar(conn, layer, coord_system, bbox=None, zoom=None):
+    """Select a layer's features as a columnar body (never clustered)"""
+    table, type_table, type_fk, geom_type = MAP_LAYERS[layer]
+    conditions, params = layer_conditions(layer, coord_system, bbox, zoom)
+    geometry, select_params = geometry_expression(layer, coord_system, zoom)
+    
+    names = ['id', 'number', 'owner_id']
+    if type_table:
+        names += [type_fk, 'state_id']
+    
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {', '.join(f't.{name}' for name in names)}, {geometry}::json as geometry
+        FROM {table} t
+        WHERE {' AND '.join(conditions)}
+        LIMIT %s
+    """, select_params + params + [Config.MAP_MAX_FEATURES + 1])
+    rows = cur.fetchall()
+    cur.close()
+    
+    truncated = len(rows) > Config.MAP_MAX_FEATURES
+    return columnar_body(names + ['geometry'], rows[:Config.MAP_MAX_FEATURES],
+                         layer=layer, truncated=truncated, clustered=False)
+
+def stream_feature_collection(cur, max_features, extra=None):
+    """
+    Yield a FeatureCollection document from a cursor whose last column is feature JSON text
+    
+    Rows are fetched in chunks of cursor.itersize so memory stays bounded.
+    """
+    count = 0
+    truncated = False
+    
+    yield '{"type": "FeatureCollection", "features": ['
+    try:
+        while not truncated:
+            rows = cur.fetchmany(cur.itersize)
+            if not rows:
+                break
+            if count + len(rows) > max_features:
+                rows = rows[:max_features - count]
+                truncated = True
+            if rows:
+                yield (',' if count else '') + ','.join(row[-1] for row in rows)
+                count += len(rows)
+    finally:
+        cur.close()
+    members = {'count': count, 'truncated': truncated}
+    members.update(extra or {})
+    yield '], ' + json.dumps(members)[1:]
+
+def layer_tables(layer):
+    """Tables a map layer response is built from"""
+    if layer not in MAP_LAYERS:
+        return None
+    table, type_table = MAP_LAYERS[layer][:2]
+    if type_table:
+        return [table, type_table, 'ref_object_states', 'owners']
+    if layer == 'channel_directions' and request.args.get('style') == 'occupancy':
+        return sorted(set(NETWORK_TABLES + ['owners']))
+    return [table, 'owners']
+
 @app.route('/api/map/geojson/<layer>')
 @login_required
+@etag_versioned(layer_tables)
+@response_cached
 def get_layer_geojson(layer):
-    """Get GeoJSON for a specific layer"""
-    coord_system = request.args.get('crs', 'wgs84')
-    geom_col = 'geom_wgs84' if coord_system == 'wgs84' else 'geom_msk86'
+    """
+    Get GeoJSON for a specific layer, optionally limited to a bbox
     
-    table_map = {
-        'wells': ('wells', 'ref_well_types', 'well_type_id', 'Point'),
-        'marker_posts': ('marker_posts', 'ref_marker_post_types', 'marker_type_id', 'Point'),
-        'channel_directions': ('channel_directions', None, None, 'LineString'),
-        'ground_cables': ('ground_cables', 'ref_cable_types', 'cable_type_id', 'LineString'),
-        'aerial_cables': ('aerial_cables', 'ref_cable_types', 'cable_type_id', 'LineString'),
-        'duct_cables': ('duct_cables', 'ref_cable_types', 'cable_type_id', 'LineString')
-    }
+    With format=columnar the features are returned as column arrays (see columnar_body).
+    """
+    coord_system = request.args.get('crs', 'wgs84')
     
-    if layer not in table_map:
+    if layer not in MAP_LAYERS:
         return jsonify({'error': 'Unknown layer'}), 400
     
-    table, type_table, type_fk, geom_type = table_map[layer]
+    try:
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        zoom = parse_zoom(request.args['zoom']) if request.args.get('zoom') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if wants_columnar():
+        try:
+            return jsonify(layer_columnar(get_db(), layer, coord_system, bbox, zoom))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    try:
+        cur, clustered = open_layer_cursor(get_db(), layer, coord_system, bbox, zoom)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(stream_with_context(stream_feature_collection(cur, Config.MAP_MAX_FEATURES,
+                                                                  {'clustered': clustered})),
+                    mimetype='application/geo+json')
+
+def batch_layer_tables():
+    """Tables a multi-layer map response is built from"""
+    tables = set()
+    for layer in request.args.get('layers', '').split(','):
+        tables.update(layer_tables(layer) or [])
+    return sorted(tables)
+
+@app.route('/api/map/geojson')
+@login_required
+@etag_versioned(batch_layer_tables)
+@response_cached
+def get_layers_geojson():
+    """Get GeoJSON for several layers from one consistent snapshot"""
+    coord_system = request.args.get('crs', 'wgs84')
+    layer_names = [l for l in request.args.get('layers', '').split(',') if l]
+    
+    if not layer_names:
+        return jsonify({'error': 'No layers requested'}), 400
+    unknown = [l for l in layer_names if l not in MAP_LAYERS]
+    if unknown:
+        return jsonify({'error': f'Unknown layers: {unknown}'}), 400
+    
+    try:
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        zoom = parse_zoom(request.args['zoom']) if request.args.get('zoom') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # All layers are read from one snapshot so they are consistent with each other
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cur.close()
         
-        # Build query
-        if type_table:
-            query = f"""
-                SELECT 
-                    t.id, t.number, 
-                    ST_AsGeoJSON(t.{geom_col})::json as geometry,
-                    tt.name as type_name,
-                    os.name as state_name,
-                    os.color as state_color,
-                    o.organization_name as owner_name
-                FROM {table} t
-                LEFT JOIN {type_table} tt ON t.{type_fk} = tt.id
-                LEFT JOIN ref_object_states os ON t.state_id = os.id
-                LEFT JOIN owners o ON t.owner_id = o.id
-                WHERE t.{geom_col} IS NOT NULL
-            """
-        else:
-            query = f"""
-                SELECT 
-                    t.id, t.number,
-                    ST_AsGeoJSON(t.{geom_col})::json as geometry,
-                    NULL as type_name,
-                    NULL as state_name,
-                    '#3498db' as state_color,
-                    o.organization_name as owner_name
-                FROM {table} t
-                LEFT JOIN owners o ON t.owner_id = o.id
-                WHERE t.{geom_col} IS NOT NULL
-            """
+        cursors = []
+        for layer in dict.fromkeys(layer_names):
+            cur, clustered = open_layer_cursor(conn, layer, coord_system, bbox, zoom)
+            cursors.append((layer, cur, clustered))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        yield '{"layers": {'
+        for i, (layer, cur, clustered) in enumerate(cursors):
+            yield (', ' if i else '') + json.dumps(layer) + ': '
+            yield from stream_feature_collection(cur, Config.MAP_MAX_FEATURES, {'clustered': clustered})
+        yield '}}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def tile_reference_tables(layer):
+    """Reference tables whose names and colors are embedded in a layer's tiles"""
+    type_table = MAP_LAYERS[layer][1]
+    if type_table:
+        return [type_table, 'ref_object_states', 'owners']
+    return ['owners']
+
+def tile_variant(layer, coord_system):
+    """
+    Tile cache CRS directory for the current reference data, e.g. wgs84-12-40-41
+    
+    A change to an owner, state or type moves the layer to a fresh directory,
+    even when it was made by another worker or directly in the database,
+    so tiles with stale names or colors are never served.
+    """
+    versions = get_data_versions(tile_reference_tables(layer))
+    return '-'.join([coord_system] + [str(versions[table]) for table in sorted(versions)])
+
+@app.route('/api/map/tiles/<layer>/<int:z>/<int:x>/<int:y>.pbf')
+@login_required
+def get_layer_tile(layer, z, x, y):
+    """Get a Mapbox Vector Tile for a layer (Web Mercator z/x/y grid)"""
+    coord_system = request.args.get('crs', 'wgs84')
+    if coord_system not in ('wgs84', 'msk86'):
+        return jsonify({'error': 'Unknown coordinate system'}), 400
+    
+    if layer not in MAP_LAYERS:
+        return jsonify({'error': 'Unknown layer'}), 400
+    
+    if not 0 <= z <= Config.MAP_MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        return jsonify({'error': 'Invalid tile coordinates'}), 400
+    
+    try:
+        variant = tile_variant(layer, coord_system)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    tile = tile_cache.get(layer, variant, z, x, y)
+    
+    if tile is None:
+        geom_col, srid = get_geom_column(coord_system)
+        try:
+            attributes, from_clause, from_params = layer_source(layer)
+            conn = get_db()
+            cur = conn.cursor()
+            cur.execute(f"""
+                WITH bounds AS (
+                    SELECT env, ST_Expand(env, (ST_XMax(env) - ST_XMin(env)) * %s) AS search_env
+                    FROM ST_TileEnvelope(%s, %s, %s) AS env
+                ),
+                mvt AS (
+                    SELECT 
+                        t.id, t.number,
+                        ST_AsMVTGeom(ST_Transform(t.{geom_col}, 3857), bounds.env,
+                                     %s, %s, true) AS geom,
+                        {select_columns(attributes)}
+                    FROM bounds, {from_clause}
+                    WHERE t.{geom_col} && ST_Transform(bounds.search_env, {srid})
+                )
+                SELECT ST_AsMVT(mvt, %s, %s, 'geom', 'id') FROM mvt
+            """, (Config.TILE_BUFFER / Config.TILE_EXTENT, z, x, y,
+                  Config.TILE_EXTENT, Config.TILE_BUFFER, *from_params, layer, Config.TILE_EXTENT))
+            tile = bytes(cur.fetchone()[0] or b'')
+            cur.close()
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
         
-        cur.execute(query)
-        rows = cur.fetchall()
+        tile_cache.set(layer, variant, z, x, y, tile)
+    
+    return Response(tile, mimetype='application/vnd.mapbox-vector-tile')
+
+def get_object_bounds(table, object_id):
+    """Get WGS84 bounds of an object's geometry, or None"""
+    cur = get_db().cursor()
+    cur.execute(f"""
+        SELECT ST_XMin(geom_wgs84), ST_YMin(geom_wgs84), ST_XMax(geom_wgs84), ST_YMax(geom_wgs84)
+        FROM {table} WHERE id = %s AND geom_wgs84 IS NOT NULL
+    """, (object_id,))
+    row = cur.fetchone()
+    cur.close()
+    return tuple(row) if row else None
+
+def invalidate_tiles(layer, *bounds_list):
+    """Drop cached tiles covering the given object bounds"""
+    if layer not in MAP_LAYERS:
+        return
+    for bounds in bounds_list:
+        if bounds:
+            tile_cache.invalidate_bounds(layer, bounds)
+
+# ============================================
+# API - DELTA SYNC
+# ============================================
+
+SYNC_TABLES = list(MAP_LAYERS) + ['cable_channels']
+
+change_log_pruned_at = None  # monotonic time of this worker's last prune
+
+def prune_change_log():
+    """Delete change log entries past the retention period, at most once per interval per worker"""
+    global change_log_pruned_at
+    now = time.monotonic()
+    if change_log_pruned_at is not None and now - change_log_pruned_at < Config.CHANGE_LOG_PRUNE_INTERVAL:
+        return
+    change_log_pruned_at = now
+    
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT prune_change_log(%s * INTERVAL '1 day')", (Config.CHANGE_LOG_RETENTION_DAYS,))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error pruning change log: {e}")
+    finally:
         cur.close()
-        conn.close()
+
+def sync_watermark(cur):
+    """Return (next watermark, oldest watermark the change log can still serve)"""
+    cur.execute("""
+        SELECT txid_snapshot_xmin(txid_current_snapshot()),
+               (SELECT pruned_txid FROM change_log_horizon)
+    """)
+    next_since, horizon = cur.fetchone()
+    return next_since, horizon or 0
+
+@app.route('/api/changes')
+@login_required
+def get_changes():
+    """
+    Get objects changed since a sync watermark
+    
+    Watermarks are transaction ids: each response covers every change made by
+    transactions older than the oldest one still running, so a change committed
+    late is never skipped. Without `since`, when `since` predates the retained
+    change log, or when too much has changed, the response has reset=true and
+    the client should reload the layers in full.
+    """
+    coord_system = request.args.get('crs', 'wgs84')
+    layer_names = [l for l in request.args.get('layers', '').split(',') if l] or SYNC_TABLES
+    
+    unknown = [l for l in layer_names if l not in SYNC_TABLES]
+    if unknown:
+        return jsonify({'error': f'Unknown layers: {unknown}'}), 400
+    
+    try:
+        since = int(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    
+    try:
+        prune_change_log()
+        conn = get_db()
+        conn.rollback()
+        cur = conn.cursor()
+        # Watermark, horizon and log are read from the same snapshot
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        next_since, horizon = sync_watermark(cur)
         
-        # Build GeoJSON FeatureCollection
-        features = []
-        for row in rows:
-            if row['geometry']:
-                feature = {
-                    'type': 'Feature',
-                    'id': row['id'],
-                    'geometry': row['geometry'],
-                    'properties': {
-                        'id': row['id'],
-                        'number': row['number'],
-                        'layer': layer,
-                        'type_name': row['type_name'],
-                        'state_name': row['state_name'],
-                        'state_color': row['state_color'],
-                        'owner_name': row['owner_name']
-                    }
-                }
-                features.append(feature)
-        
-        geojson = {
-            'type': 'FeatureCollection',
-            'features': features
-        }
+        if since is None or since > next_since or since < horizon:
+            cur.close()
+            return jsonify({'since': since, 'next_since': next_since, 'reset': True, 'layers': {}})
+        
+        # Latest operation per object
+        cur.execute("""
+            SELECT DISTINCT ON (table_name, object_id) table_name, object_id, operation
+            FROM change_log
+            WHERE txid >= %s AND txid < %s AND table_name = ANY(%s)
+            ORDER BY table_name, object_id, seq DESC
+            LIMIT %s
+        """, (since, next_since, layer_names, Config.SYNC_MAX_CHANGES + 1))
+        changes = cur.fetchall()
+        
+        if len(changes) > Config.SYNC_MAX_CHANGES:
+            cur.close()
+            return jsonify({'since': since, 'next_since': next_since, 'reset': True, 'layers': {}})
+        
+        upserted = {}
+        deleted = {}
+        for table_name, object_id, operation in changes:
+            target = deleted if operation == 'D' else upserted
+            target.setdefault(table_name, []).append(object_id)
+        
+        parts = []
+        for layer in layer_names:
+            upsert_ids = upserted.get(layer, [])
+            deleted_ids = deleted.get(layer, [])
+            if not upsert_ids and not deleted_ids:
+                continue
+            
+            if layer == 'cable_channels':
+                dict_cur = conn.cursor(cursor_factory=RealDictCursor)
+                dict_cur.execute("""
+                    SELECT cc.*, cd.number as direction_number
+                    FROM cable_channels cc
+                    LEFT JOIN channel_directions cd ON cc.channel_direction_id = cd.id
+                    WHERE cc.id = ANY(%s)
+                    ORDER BY cc.id
+                """, (upsert_ids,))
+                rows = dict_cur.fetchall()
+                dict_cur.close()
+                parts.append(f'{json.dumps(layer)}: {{"objects": {app.json.dumps(rows)}, '
+                             f'"deleted": {json.dumps(deleted_ids)}}}')
+                continue
+            
+            features = []
+            if upsert_ids:
+                query, params = build_layer_query(layer, coord_system, as_feature=True, ids=upsert_ids)
+                cur.execute(query, params)
+                features = cur.fetchall()
+            
+            # Objects that lost their geometry disappear from the map as well
+            returned = {row[0] for row in features}
+            deleted_ids += [i for i in upsert_ids if i not in returned]
+            
+            parts.append(f'{json.dumps(layer)}: {{"type": "FeatureCollection", '
+                         f'"features": [{",".join(row[1] for row in features)}], '
+                         f'"deleted": {json.dumps(sorted(deleted_ids))}}}')
         
-        return jsonify(geojson)
+        cur.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    body = (f'{{"since": {since}, "next_since": {next_since}, "reset": false, '
+            f'"layers": {{{", ".join(parts)}}}}}')
+    return Response(body, mimetype='application/json')
+
+# ============================================
+# API - DUCT NETWORK
+# ============================================
+
+duct_network = DuctNetwork()
+
+NETWORK_TABLES = ['channel_directions', 'cable_channels', 'duct_cable_channels']
+
+def load_network_directions(cur, ids=None):
+    """Put directions (all, or the given ids) into the graph; ids no longer present are removed"""
+    query = "SELECT id, start_well_id, end_well_id, ST_Length(geom_msk86) FROM channel_directions"
+    if ids is None:
+        cur.execute(query)
+    else:
+        cur.execute(query + " WHERE id = ANY(%s)", (list(ids),))
+    found = set()
+    for direction_id, start_well, end_well, length in cur.fetchall():
+        duct_network.set_direction(direction_id, start_well, end_well, length)
+        found.add(direction_id)
+    for direction_id in set(ids or []) - found:
+        duct_network.remove_direction(direction_id)
+
+# Occupancy of every direction and its channels, aggregated in one pass
+OCCUPANCY_QUERY = """
+    SELECT cd.id as direction_id, cd.number,
+           COUNT(cc.id) as channels,
+           COUNT(occ.cable_channel_id) as occupied_channels,
+           COALESCE(SUM(occ.cables), 0)::int as cables,
+           ROUND(COUNT(occ.cable_channel_id)::numeric / NULLIF(COUNT(cc.id), 0), 4)::float as fill_ratio,
+           COALESCE(json_agg(json_build_object(
+               'channel_id', cc.id,
+               'channel_order', cc.channel_order,
+               'cables', COALESCE(occ.cables, 0)
+           ) ORDER BY cc.channel_order) FILTER (WHERE cc.id IS NOT NULL), '[]'::json) as channel_list
+    FROM channel_directions cd
+    LEFT JOIN cable_channels cc ON cc.channel_direction_id = cd.id
+    LEFT JOIN (
+        SELECT cable_channel_id, COUNT(*) as cables
+        FROM duct_cable_channels
+        GROUP BY cable_channel_id
+    ) occ ON occ.cable_channel_id = cc.id
+    GROUP BY cd.id, cd.number
+    ORDER BY cd.id
+"""
+
+# Fill ratio below bound -> map color
+OCCUPANCY_COLORS = [(0.5, '#2ecc71'), (0.8, '#f1c40f'), (1.0, '#e67e22')]
+OCCUPANCY_FULL_COLOR = '#e74c3c'
+OCCUPANCY_NO_CHANNELS_COLOR = '#95a5a6'
+
+def occupancy_report():
+    """Occupancy rows per direction, cached until a network table changes"""
+    return cached_reference('occupancy', NETWORK_TABLES, OCCUPANCY_QUERY)
+
+def occupancy_color(fill_ratio):
+    """Map color for a direction fill ratio"""
+    if fill_ratio is None:
+        return OCCUPANCY_NO_CHANNELS_COLOR
+    return next((color for bound, color in OCCUPANCY_COLORS if fill_ratio < bound), OCCUPANCY_FULL_COLOR)
+
+def load_network_occupancy(cur):
+    """Reload channel occupancy per direction and the directions of each duct cable"""
+    occupancy = {row['direction_id']: (row['occupied_channels'], row['channels'])
+                 for row in occupancy_report()}
+    
+    cur.execute("""
+        SELECT dcc.duct_cable_id, cc.channel_direction_id
+        FROM duct_cable_channels dcc
+        JOIN cable_channels cc ON cc.id = dcc.cable_channel_id
+    """)
+    cable_directions = {}
+    for cable_id, direction_id in cur.fetchall():
+        cable_directions.setdefault(cable_id, set()).add(direction_id)
+    
+    duct_network.set_occupancy(occupancy, cable_directions)
+
+def refresh_network():
+    """
+    Bring the duct network graph up to date
+    
+    Nothing is queried beyond the version stamps while the tables are
+    unchanged. Changed directions are applied from the change log since the
+    last txid watermark; occupancy is recounted in one aggregate.
+    """
+    versions = get_data_versions(NETWORK_TABLES)
+    if versions == duct_network.versions:
+        return
+    
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        with duct_network.lock:
+            if versions == duct_network.versions:
+                return
+            
+            watermark, horizon = sync_watermark(cur)
+            
+            if duct_network.watermark is None or duct_network.watermark < horizon:
+                duct_network.clear()
+                load_network_directions(cur)
+            elif versions['channel_directions'] != duct_network.versions.get('channel_directions'):
+                # Changes are re-read from the old watermark, so none are missed
+                cur.execute("""
+                    SELECT DISTINCT object_id FROM change_log
+                    WHERE table_name = 'channel_directions' AND txid >= %s
+                    LIMIT %s
+                """, (duct_network.watermark, Config.SYNC_MAX_CHANGES + 1))
+                changed = [row[0] for row in cur.fetchall()]
+                if len(changed) > Config.SYNC_MAX_CHANGES:
+                    duct_network.clear()
+                    load_network_directions(cur)
+                else:
+                    load_network_directions(cur, changed)
+            
+            load_network_occupancy(cur)
+            duct_network.watermark = watermark
+            duct_network.versions = versions
+    finally:
+        cur.close()
+
+@app.route('/api/network/route')
+@login_required
+def get_network_route():
+    """
+    Trace a route through the duct network between two wells
+    
+    Query parameters:
+        from, to: well ids
+        mode: 'shortest' (by length, default) or 'least_occupied'
+              (avoids full directions, then minimises channel fill)
+    """
+    mode = request.args.get('mode', DuctNetwork.SHORTEST)
+    if mode not in (DuctNetwork.SHORTEST, DuctNetwork.LEAST_OCCUPIED):
+        return jsonify({'error': 'Unknown mode'}), 400
+    
+    try:
+        from_well = int(request.args['from'])
+        to_well = int(request.args['to'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'from and to must be well ids'}), 400
+    
+    try:
+        refresh_network()
+        with duct_network.lock:
+            route = duct_network.route(from_well, to_well, mode)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    if route is None:
+        return jsonify({'error': 'Маршрут не найден'}), 404
+    
+    route.update({'from': from_well, 'to': to_well, 'mode': mode})
+    return jsonify(route)
+
+@app.route('/api/network/occupancy')
+@login_required
+@etag_versioned(lambda: NETWORK_TABLES)
+def get_network_occupancy():
+    """
+    Get channel occupancy per direction
+    
+    Query parameters:
+        direction_id: comma-separated direction ids (default: all)
+        channels: 1 to include per-channel cable counts
+    """
+    try:
+        ids = set(parse_id_list(request.args['direction_id'])) if request.args.get('direction_id') else None
+    except ValueError:
+        return jsonify({'error': 'direction_id must be comma-separated integers'}), 400
+    
+    try:
+        rows = occupancy_report()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    with_channels = request.args.get('channels') == '1'
+    data = [
+        {key: value for key, value in row.items() if with_channels or key != 'channel_list'}
+        for row in rows if ids is None or row['direction_id'] in ids
+    ]
+    return jsonify(data)
+
+@app.route('/api/network/cable/<int:cable_id>/path')
+@login_required
+def get_cable_path(cable_id):
+    """Get the wells and directions a duct cable runs through, in order"""
+    try:
+        refresh_network()
+        with duct_network.lock:
+            segments = duct_network.chain(duct_network.cable_directions.get(cable_id, ()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'cable_id': cable_id,
+        'segments': segments,
+        'length': sum(segment['length'] for segment in segments)
+    })
+
+# ============================================
+# API - SEARCH
+# ============================================
+
+def number_match(column, key):
+    """
+    Return (condition, rank, score) SQL matching a number column against params key / key_prefix
+    
+    Prefix (ILIKE) and fuzzy (%) matches are both answered from the trigram
+    GIN index; exact matches rank first, then prefixes, then by similarity.
+    """
+    condition = f"({column} ILIKE %({key}_prefix)s OR {column} %% %({key})s)"
+    rank = (f"CASE WHEN lower({column}) = lower(%({key})s) THEN 2 "
+            f"WHEN {column} ILIKE %({key}_prefix)s THEN 1 ELSE 0 END")
+    score = f"similarity({column}, %({key})s)"
+    return condition, rank, score
+
+def like_prefix(value):
+    """ILIKE pattern matching strings that start with value"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+@app.route('/api/search')
+@login_required
+def search_objects():
+    """
+    Find objects by number across all object tables
+    
+    Query parameters:
+        q: number or its beginning; '<direction>/<order>' also finds channels
+        layers: comma-separated layers (default: all)
+        limit: number of results (capped at SEARCH_MAX_RESULTS)
+    
+    Returns id, layer, number, the centroid and bbox (WGS84) of each match.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    
+    search_layers = list(MAP_LAYERS) + ['cable_channels']
+    layer_names = [l for l in request.args.get('layers', '').split(',') if l] or search_layers
+    unknown = [l for l in layer_names if l not in search_layers]
+    if unknown:
+        return jsonify({'error': f'Unknown layers: {unknown}'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', Config.SEARCH_MAX_RESULTS)), Config.SEARCH_MAX_RESULTS)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    
+    params = {'q': q, 'q_prefix': like_prefix(q), 'limit': limit}
+    location = """ST_X(ST_Centroid({geom})) as lon, ST_Y(ST_Centroid({geom})) as lat,
+                json_build_array(ST_XMin({geom}), ST_YMin({geom}), ST_XMax({geom}), ST_YMax({geom})) as bbox"""
+    parts = []
+    
+    for layer in dict.fromkeys(layer_names):
+        if layer == 'cable_channels':
+            # Channels have no number of their own: "<direction number>/<channel order>"
+            direction, _, order = q.rpartition('/')
+            if not direction or not order.isdigit():
+                continue
+            params.update({'dq': direction, 'dq_prefix': like_prefix(direction), 'order': int(order)})
+            condition, rank, score = number_match('cd.number', 'dq')
+            parts.append(f"""(
+                SELECT 'cable_channels' as layer, cc.id, cd.number || '/' || cc.channel_order as number,
+                    {rank} as rank, {score} as score,
+                    {location.format(geom='cd.geom_wgs84')}
+                FROM cable_channels cc
+                JOIN channel_directions cd ON cd.id = cc.channel_direction_id
+                WHERE {condition} AND cc.channel_order = %(order)s
+                ORDER BY rank DESC, score DESC
+                LIMIT %(limit)s
+            )""")
+            continue
+        
+        condition, rank, score = number_match('t.number', 'q')
+        parts.append(f"""(
+            SELECT '{layer}' as layer, t.id, t.number,
+                {rank} as rank, {score} as score,
+                {location.format(geom='t.geom_wgs84')}
+            FROM {MAP_LAYERS[layer][0]} t
+            WHERE {condition}
+            ORDER BY rank DESC, score DESC
+            LIMIT %(limit)s
+        )""")
+    
+    if not parts:
+        return jsonify({'q': q, 'results': []})
+    
+    try:
+        cur = get_db().cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"""
+            SELECT r.* FROM ({' UNION ALL '.join(parts)}) r
+            ORDER BY r.rank DESC, r.score DESC, r.number
+            LIMIT %(limit)s
+        """, params)
+        results = cur.fetchall()
+        cur.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    for result in results:
+        result['score'] = round(result['score'], 4)
+        if result['bbox'] and result['bbox'][0] is None:
+            result['bbox'] = None
+    
+    return jsonify({'q': q, 'results': results})
+
+@app.route('/api/search/nearby')
+@login_required
+def search_nearby():
+    """
+    Find the objects nearest to a WGS84 point across map layers
+    
+    Query parameters:
+        lat, lon: point in WGS84
+        radius: optional search radius in metres
+        layers: comma-separated layers (default: all)
+        k: number of results (capped at SEARCH_MAX_K)
+    
+    Each layer is searched with a KNN (<->) scan of the GIST index on
+    geom_msk86, so distances are in metres; results are merged by distance.
+    """
+    layer_names = [l for l in request.args.get('layers', '').split(',') if l] or list(MAP_LAYERS)
+    unknown = [l for l in layer_names if l not in MAP_LAYERS]
+    if unknown:
+        return jsonify({'error': f'Unknown layers: {unknown}'}), 400
+    
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = min(int(request.args.get('k', Config.SEARCH_DEFAULT_K)), Config.SEARCH_MAX_K)
+        radius = float(request.args['radius']) if request.args.get('radius') else None
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise ValueError('lat/lon out of range')
+        if k < 1:
+            raise ValueError('k must be positive')
+        if radius is not None and not 0 < radius <= Config.SEARCH_MAX_RADIUS:
+            raise ValueError(f'radius must be between 0 and {Config.SEARCH_MAX_RADIUS} m')
+    except KeyError:
+        return jsonify({'error': 'lat and lon are required'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    point = f"ST_Transform(ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), {Config.SRID_WGS84}), {Config.SRID_MSK86_ZONE4})"
+    within = f" AND ST_DWithin(t.geom_msk86, {point}, %(radius)s)" if radius is not None else ""
+    
+    # Nearest k per layer from the index, then the nearest k overall
+    parts = [f"""(
+            SELECT '{layer}' as layer,
+                t.id, t.number,
+                ST_Distance(t.geom_msk86, {point}) as distance,
+                ST_AsGeoJSON(ST_Transform(ST_ClosestPoint(t.geom_msk86, {point}), {Config.SRID_WGS84}))::json as nearest_point
+            FROM {MAP_LAYERS[layer][0]} t
+            WHERE t.geom_msk86 IS NOT NULL{within}
+            ORDER BY t.geom_msk86 <-> {point}
+            LIMIT %(k)s
+        )""" for layer in dict.fromkeys(layer_names)]
+    
+    try:
+        cur = get_db().cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"""
+            SELECT r.* FROM ({' UNION ALL '.join(parts)}) r
+            ORDER BY r.distance
+            LIMIT %(k)s
+        """, {'lat': lat, 'lon': lon, 'radius': radius, 'k': k})
+        results = cur.fetchall()
+        cur.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    for result in results:
+        result['distance'] = round(result['distance'], 2)
+    
+    return jsonify({'lat': lat, 'lon': lon, 'radius': radius, 'results': results})
 
 # ============================================
 # API - OBJECTS CRUD
 # ============================================
 
+def object_fields(*columns):
+    """Field -> SQL expression map for a geometry object table"""
+    fields = {
+        'id': 't.id',
+        'number': 't.number',
+        'geom_wgs84': 'ST_AsGeoJSON(t.geom_wgs84)::json',
+        'geom_msk86': 'ST_AsGeoJSON(t.geom_msk86)::json',
+        'owner_id': 't.owner_id'
+    }
+    fields.update((column, f't.{column}') for column in columns)
+    fields.update({
+        'description': 't.description',
+        'created_at': 't.created_at',
+        'updated_at': 't.updated_at'
+    })
+    return fields
+
+# Object type -> (table, {field: SQL expression}, type FK column)
+OBJECT_LIST_CONFIG = {
+    'wells': ('wells', object_fields('well_type_id', 'state_id'), 'well_type_id'),
+    'marker_posts': ('marker_posts', object_fields('marker_type_id', 'state_id'), 'marker_type_id'),
+    'channel_directions': ('channel_directions', object_fields('start_well_id', 'end_well_id'), None),
+    'ground_cables': ('ground_cables', object_fields('cable_type_id', 'contract_id', 'state_id'), 'cable_type_id'),
+    'aerial_cables': ('aerial_cables', object_fields('cable_type_id', 'contract_id', 'state_id'), 'cable_type_id'),
+    'duct_cables': ('duct_cables', object_fields('cable_type_id', 'contract_id', 'state_id'), 'cable_type_id'),
+    'cable_channels': ('cable_channels', {
+        'id': 't.id',
+        'channel_direction_id': 't.channel_direction_id',
+        'channel_order': 't.channel_order',
+        'channel_type_id': 't.channel_type_id',
+        'state_id': 't.state_id',
+        'description': 't.description',
+        'created_at': 't.created_at',
+        'updated_at': 't.updated_at',
+        'direction_number': 'cd.number'
+    }, 'channel_type_id')
+}
+
+# Fields returned when the request has no fields= parameter
+OBJECT_LIST_DEFAULT_FIELDS = ['id', 'number', 'geom_wgs84', 'geom_msk86', 'owner_id', 'state_id',
+                              'description', 'created_at', 'updated_at']
+
+def parse_id_list(value):
+    """Parse '1,2,3' into a list of ints"""
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def fetch_objects(object_type, ids):
+    """
+    Fetch full objects with their photos in a single query
+    
+    Photos are aggregated per object by a lateral json_agg, so any number of
+    objects costs one round trip.
+    """
+    table = OBJECT_LIST_CONFIG[object_type][0]
+    
+    if object_type == 'cable_channels':
+        geometry = ""
+    elif MAP_LAYERS[object_type][3] == 'Point':
+        geometry = """,
+                ST_AsGeoJSON(t.geom_wgs84)::json as geom_wgs84,
+                ST_AsGeoJSON(t.geom_msk86)::json as geom_msk86,
+                ST_X(t.geom_wgs84) as lon_wgs84,
+                ST_Y(t.geom_wgs84) as lat_wgs84"""
+    else:
+        geometry = """,
+                ST_AsGeoJSON(t.geom_wgs84)::json as geom_wgs84,
+                ST_AsGeoJSON(t.geom_msk86)::json as geom_msk86"""
+    
+    cur = get_db().cursor(cursor_factory=RealDictCursor)
+    cur.execute(f"""
+        SELECT t.*{geometry},
+            COALESCE(p.photos, '[]'::json) as photos
+        FROM {table} t
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object(
+                'id', ph.id,
+                'filename', ph.filename,
+                'original_filename', ph.original_filename,
+                'file_path', ph.file_path,
+                'description', ph.description
+            ) ORDER BY ph.photo_order) as photos
+            FROM object_photos ph
+            WHERE ph.object_type = %s AND ph.object_id = t.id
+        ) p ON TRUE
+        WHERE t.id = ANY(%s)
+        ORDER BY t.id
+    """, (object_type, list(ids)))
+    data = cur.fetchall()
+    cur.close()
+    return data
+
+def object_list_tables(object_type):
+    """Tables an object list response is built from"""
+    if object_type == 'cable_channels':
+        tables = ['cable_channels', 'channel_directions']
+    elif object_type in MAP_LAYERS:
+        tables = [object_type]
+    else:
+        return None
+    # Batch fetches by id include photos
+    if request.args.get('ids'):
+        tables.append('object_photos')
+    # Columnar lookups are read from the reference tables
+    elif wants_columnar():
+        fields = OBJECT_LIST_CONFIG[object_type][1]
+        tables.extend(sorted({REFERENCE_COLUMNS[f][0] for f in fields if f in REFERENCE_COLUMNS}))
+    return tables
+
 @app.route('/api/objects/<object_type>', methods=['GET'])
 @login_required
+@etag_versioned(object_list_tables)
+@response_cached
 def get_objects(object_type):
-    """Get all objects of a type"""
-    table_map = {
-        'wells': 'wells',
-        'marker_posts': 'marker_posts',
-        'channel_directions': 'channel_directions',
-        'cable_channels': 'cable_channels',
-        'ground_cables': 'ground_cables',
-        'aerial_cables': 'aerial_cables',
-        'duct_cables': 'duct_cables'
-    }
+    """
+    Get a page of objects of a type
     
-    if object_type not in table_map:
+    Query parameters:
+        ids: comma-separated ids; returns those complete objects with photos
+        after: return objects with id greater than this cursor
+        limit: page size (capped at OBJECTS_MAX_PAGE_SIZE)
+        fields: comma-separated fields to return (omit geom_* to skip geometry)
+        format: 'columnar' for column arrays with reference lookups (pages only)
+        owner_id, state_id, type_id: comma-separated id filters
+        updated_after, updated_before: updated_at range (ISO timestamps)
+    """
+    if object_type not in OBJECT_LIST_CONFIG:
         return jsonify({'error': 'Unknown object type'}), 400
     
+    table, fields, type_fk = OBJECT_LIST_CONFIG[object_type]
+    args = request.args
+    
+    # Batch fetch of complete objects (with photos) by id
+    if args.get('ids'):
+        try:
+            ids = parse_id_list(args['ids'])
+        except ValueError:
+            return jsonify({'error': 'ids must be comma-separated integers'}), 400
+        if len(ids) > Config.OBJECTS_MAX_PAGE_SIZE:
+            return jsonify({'error': f'At most {Config.OBJECTS_MAX_PAGE_SIZE} ids per request'}), 400
+        try:
+            return jsonify({'objects': fetch_objects(object_type, ids), 'next_cursor': None})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get objects with geometry as GeoJSON
-        if object_type == 'cable_channels':
-            query = """
-                SELECT cc.*, cd.number as direction_number
-                FROM cable_channels cc
-                LEFT JOIN channel_directions cd ON cc.channel_direction_id = cd.id
-                ORDER BY cc.id
-            """
+        limit = min(int(args.get('limit', Config.OBJECTS_PAGE_SIZE)), Config.OBJECTS_MAX_PAGE_SIZE)
+        after = int(args['after']) if args.get('after') else None
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        
+        if args.get('fields'):
+            selected = [f for f in args['fields'].split(',') if f]
+            unknown = [f for f in selected if f not in fields]
+            if unknown:
+                raise ValueError(f'Unknown fields: {unknown}')
+        elif object_type == 'cable_channels':
+            selected = list(fields)
         else:
-            query = f"""
-                SELECT id, number, 
-                    ST_AsGeoJSON(geom_wgs84)::json as geom_wgs84,
-                    ST_AsGeoJSON(geom_msk86)::json as geom_msk86,
-                    owner_id, state_id, description,
-                    created_at, updated_at
-                FROM {table_map[object_type]}
-                ORDER BY id
-            """
+            selected = [f for f in OBJECT_LIST_DEFAULT_FIELDS if f in fields]
+        # The id is the pagination cursor
+        if 'id' not in selected:
+            selected.insert(0, 'id')
+        
+        conditions = []
+        params = []
+        
+        if after is not None:
+            conditions.append("t.id > %s")
+            params.append(after)
+        
+        filters = {'owner_id': 'owner_id', 'state_id': 'state_id', 'type_id': type_fk}
+        for arg, column in filters.items():
+            if not args.get(arg):
+                continue
+            if not column or column not in fields:
+                raise ValueError(f'Filter {arg} is not supported for {object_type}')
+            conditions.append(f"t.{column} = ANY(%s)")
+            params.append(parse_id_list(args[arg]))
+        
+        if args.get('updated_after'):
+            conditions.append("t.updated_at >= %s")
+            params.append(datetime.fromisoformat(args['updated_after']))
+        if args.get('updated_before'):
+            conditions.append("t.updated_at < %s")
+            params.append(datetime.fromisoformat(args['updated_before']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    join = "LEFT JOIN channel_directions cd ON t.channel_direction_id = cd.id" if object_type == 'cable_channels' else ""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    try:
+        conn = get_db()
+        cur = conn.cursor() if wants_columnar() else conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute(query)
+        # Keyset pagination on the primary key; one extra row tells whether there is a next page
+        query = f"""
+            SELECT {', '.join(f'{fields[f]} as {f}' for f in selected)}
+            FROM {table} t
+            {join}
+            {where}
+            ORDER BY t.id
+            LIMIT %s
+        """
+        cur.execute(query, params + [limit + 1])
         data = cur.fetchall()
         cur.close()
-        conn.close()
-        return jsonify(data)
+        
+        has_more = len(data) > limit
+        data = data[:limit]
+        
+        if wants_columnar():
+            return jsonify(columnar_body(selected, data,
+                                         next_cursor=data[-1][selected.index('id')] if has_more else None))
+        
+        return jsonify({
+            'objects': data,
+            'next_cursor': data[-1]['id'] if has_more else None
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -419,54 +1836,38 @@ def get_objects(object_type):
 @login_required
 def get_object(object_type, object_id):
     """Get single object by ID"""
-    table_map = {
-        'wells': 'wells',
-        'marker_posts': 'marker_posts',
-        'channel_directions': 'channel_directions',
-        'cable_channels': 'cable_channels',
-        'ground_cables': 'ground_cables',
-        'aerial_cables': 'aerial_cables',
-        'duct_cables': 'duct_cables'
-    }
-    
-    if object_type not in table_map:
+    if object_type not in OBJECT_LIST_CONFIG:
         return jsonify({'error': 'Unknown object type'}), 400
     
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        if object_type == 'cable_channels':
-            query = "SELECT * FROM cable_channels WHERE id = %s"
-        else:
-            query = f"""
-                SELECT *, 
-                    ST_AsGeoJSON(geom_wgs84)::json as geom_wgs84,
-                    ST_AsGeoJSON(geom_msk86)::json as geom_msk86,
-                    ST_X(geom_wgs84) as lon_wgs84,
-                    ST_Y(geom_wgs84) as lat_wgs84
-                FROM {table_map[object_type]} WHERE id = %s
-            """
-        
-        cur.execute(query, (object_id,))
-        data = cur.fetchone()
-        
-        # Get photos
-        if data:
-            cur.execute("""
-                SELECT id, filename, original_filename, file_path, description
-                FROM object_photos
-                WHERE object_type = %s AND object_id = %s
-                ORDER BY photo_order
-            """, (object_type, object_id))
-            data['photos'] = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        return jsonify(data) if data else jsonify({'error': 'Not found'}), 404 if not data else 200
+        data = fetch_objects(object_type, [object_id])
+        if not data:
+            return jsonify({'error': 'Not found'}), 404
+        return jsonify(data[0])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Object type -> (table, writable fields)
+OBJECT_WRITE_FIELDS = {
+    'wells': ('wells', ['number', 'owner_id', 'well_type_id', 'state_id', 'description']),
+    'marker_posts': ('marker_posts', ['number', 'owner_id', 'marker_type_id', 'state_id', 'description']),
+    'channel_directions': ('channel_directions', ['number', 'owner_id', 'start_well_id', 'end_well_id', 'description']),
+    'ground_cables': ('ground_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description']),
+    'aerial_cables': ('aerial_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description']),
+    'duct_cables': ('duct_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description'])
+}
+
+def geometry_ewkt(data):
+    """WGS84 EWKT for lat/lon (point) or coordinates (line) in request data, or None"""
+    if 'lat' in data and 'lon' in data:
+        return f"SRID=4326;POINT({float(data['lon'])} {float(data['lat'])})"
+    if 'coordinates' in data:
+        coords = data['coordinates']
+        if len(coords) >= 2:
+            coord_str = ', '.join(f"{float(c[0])} {float(c[1])}" for c in coords)
+            return f"SRID=4326;LINESTRING({coord_str})"
+    return None
+
 @app.route('/api/objects/<object_type>', methods=['POST'])
 @login_required
 def create_object(object_type):
@@ -474,19 +1875,10 @@ def create_object(object_type):
     if current_user.is_viewer():
         return jsonify({'error': 'Недостаточно прав'}), 403
     
-    table_map = {
-        'wells': ('wells', ['number', 'owner_id', 'well_type_id', 'state_id', 'description']),
-        'marker_posts': ('marker_posts', ['number', 'owner_id', 'marker_type_id', 'state_id', 'description']),
-        'channel_directions': ('channel_directions', ['number', 'owner_id', 'start_well_id', 'end_well_id', 'description']),
-        'ground_cables': ('ground_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description']),
-        'aerial_cables': ('aerial_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description']),
-        'duct_cables': ('duct_cables', ['number', 'owner_id', 'cable_type_id', 'contract_id', 'state_id', 'description'])
-    }
-    
-    if object_type not in table_map:
+    if object_type not in OBJECT_WRITE_FIELDS:
         return jsonify({'error': 'Unknown object type'}), 400
     
-    table, fields = table_map[object_type]
+    table, fields = OBJECT_WRITE_FIELDS[object_type]
     data = request.get_json()
     
     try:
@@ -503,16 +1895,10 @@ def create_object(object_type):
                 insert_values.append(data[field])
         
         # Handle geometry
-        if 'lat' in data and 'lon' in data:
+        geometry = geometry_ewkt(data)
+        if geometry:
             insert_fields.append('geom_wgs84')
-            insert_values.append(f"SRID=4326;POINT({data['lon']} {data['lat']})")
-        elif 'coordinates' in data:
-            # For line geometries
-            coords = data['coordinates']
-            if len(coords) >= 2:
-                coord_str = ', '.join([f"{c[0]} {c[1]}" for c in coords])
-                insert_fields.append('geom_wgs84')
-                insert_values.append(f"SRID=4326;LINESTRING({coord_str})")
+            insert_values.append(geometry)
         
         placeholders = ', '.join(['%s'] * len(insert_values))
         field_names = ', '.join(insert_fields)
@@ -533,10 +1919,12 @@ def create_object(object_type):
         
         cur.execute(query, insert_values)
         new_id = cur.fetchone()['id']
+        new_bounds = get_object_bounds(table, new_id)
         conn.commit()
         
         cur.close()
-        conn.close()
+        
+        invalidate_tiles(object_type, new_bounds)
         
         return jsonify({'id': new_id, 'message': 'Объект создан'}), 201
     except Exception as e:
@@ -579,24 +1967,24 @@ def update_object(object_type, object_id):
                 values.append(data[field])
         
         # Handle geometry
-        if 'lat' in data and 'lon' in data:
+        geometry = geometry_ewkt(data)
+        if geometry:
             updates.append("geom_wgs84 = ST_GeomFromEWKT(%s)")
-            values.append(f"SRID=4326;POINT({data['lon']} {data['lat']})")
-        elif 'coordinates' in data:
-            coords = data['coordinates']
-            if len(coords) >= 2:
-                coord_str = ', '.join([f"{c[0]} {c[1]}" for c in coords])
-                updates.append("geom_wgs84 = ST_GeomFromEWKT(%s)")
-                values.append(f"SRID=4326;LINESTRING({coord_str})")
+            values.append(geometry)
         
         values.append(object_id)
         
+        old_bounds = get_object_bounds(table_map[object_type], object_id)
+        
         query = f"UPDATE {table_map[object_type]} SET {', '.join(updates)} WHERE id = %s"
         cur.execute(query, values)
+        new_bounds = get_object_bounds(table_map[object_type], object_id)
         conn.commit()
         
         cur.close()
-        conn.close()
+        
+        # Attribute changes alter tile contents too, so refresh both old and new extents
+        invalidate_tiles(object_type, old_bounds, new_bounds)
         
         return jsonify({'message': 'Объект обновлён'})
     except Exception as e:
@@ -628,17 +2016,228 @@ def delete_object(object_type, object_id):
         cur.execute("DELETE FROM object_photos WHERE object_type = %s AND object_id = %s", 
                    (object_type, object_id))
         
+        old_bounds = get_object_bounds(table_map[object_type], object_id) if object_type in MAP_LAYERS else None
+        
         # Delete object
         cur.execute(f"DELETE FROM {table_map[object_type]} WHERE id = %s", (object_id,))
         conn.commit()
         
         cur.close()
-        conn.close()
+        
+        invalidate_tiles(object_type, old_bounds)
         
         return jsonify({'message': 'Объект удалён'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def get_objects_bounds(table, ids):
+    """Get WGS84 bounds of several objects' geometries"""
+    if not ids:
+        return []
+    cur = get_db().cursor()
+    cur.execute(f"""
+        SELECT ST_XMin(geom_wgs84), ST_YMin(geom_wgs84), ST_XMax(geom_wgs84), ST_YMax(geom_wgs84)
+        FROM {table} WHERE id = ANY(%s) AND geom_wgs84 IS NOT NULL
+    """, (list(ids),))
+    rows = cur.fetchall()
+    cur.close()
+    return [tuple(row) for row in rows]
+
+def bulk_insert(cur, table, columns, rows):
+    """INSERT rows with one statement per page; returns new ids in row order"""
+    template = '(' + ', '.join('ST_GeomFromEWKT(%s)' if c == 'geom_wgs84' else '%s' for c in columns) + ')'
+    result = execute_values(cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s RETURNING id",
+                            rows, template=template, page_size=Config.BULK_PAGE_SIZE, fetch=True)
+    return [row[0] for row in result]
+
+def bulk_update(cur, table, columns, rows):
+    """UPDATE rows (id, *values) from a VALUES list; returns the ids that exist"""
+    # VALUES columns are untyped, so cast them to the target column types
+    casts = ['integer'] + ['integer' if c.endswith('_id') or c == 'updated_by' else 'text' for c in columns]
+    template = '(' + ', '.join(f'%s::{cast}' for cast in casts) + ')'
+    sets = ['updated_at = CURRENT_TIMESTAMP'] + [
+        f"{c} = ST_GeomFromEWKT(v.{c})" if c == 'geom_wgs84' else f"{c} = v.{c}" for c in columns
+    ]
+    if 'geom_wgs84' in columns:
+        # Let sync_geometries() rebuild the local projection from the new geometry
+        sets.append('geom_msk86 = NULL')
+    result = execute_values(cur, f"""
+        UPDATE {table} t SET {', '.join(sets)}
+        FROM (VALUES %s) AS v(id, {', '.join(columns)})
+        WHERE t.id = v.id
+        RETURNING t.id
+    """, rows, template=template, page_size=Config.BULK_PAGE_SIZE, fetch=True)
+    return {row[0] for row in result}
+
+def bulk_delete(cur, object_type, table, ids):
+    """DELETE objects and their photos; returns the ids that existed"""
+    cur.execute("DELETE FROM object_photos WHERE object_type = %s AND object_id = ANY(%s)", (object_type, ids))
+    cur.execute(f"DELETE FROM {table} WHERE id = ANY(%s) RETURNING id", (ids,))
+    return {row[0] for row in cur.fetchall()}
+
+def prepare_bulk_item(item, fields):
+    """Return (columns, values) set by a bulk create/update item; raises ValueError on bad input"""
+    if not isinstance(item, dict):
+        raise ValueError('Элемент должен быть объектом')
+    columns = [f for f in fields if f in item]
+    values = [item[f] for f in columns]
+    geometry = geometry_ewkt(item)
+    if geometry:
+        columns.append('geom_wgs84')
+        values.append(geometry)
+    return columns, values
+
+@app.route('/api/objects/<object_type>/bulk', methods=['POST'])
+@login_required
+def bulk_objects(object_type):
+    """
+    Create, update and delete many objects in one transaction
+    
+    Body: {"create": [{...}], "update": [{"id": 1, ...}], "delete": [ids],
+           "mode": "atomic" | "best_effort"}
+    
+    Items sharing the same set of fields are written by one execute_values
+    statement per page. In atomic mode (default) any failed item rolls back
+    everything; in best_effort mode a failed batch is retried item by item
+    under savepoints and only the failing items are skipped. The response has
+    a result per item: {"id": ..., "ok": true} or {"ok": false, "error": ...}.
+    """
+    if current_user.is_viewer():
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    if object_type not in OBJECT_WRITE_FIELDS:
+        return jsonify({'error': 'Unknown object type'}), 400
+    
+    table, fields = OBJECT_WRITE_FIELDS[object_type]
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Тело запроса должно быть объектом'}), 400
+    creates = data.get('create') or []
+    updates = data.get('update') or []
+    deletes = data.get('delete') or []
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        return jsonify({'error': 'create, update и delete должны быть списками'}), 400
+    mode = data.get('mode', 'atomic')
+    
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({'error': 'Unknown mode'}), 400
+    if deletes and not current_user.is_admin():
+        return jsonify({'error': 'Удаление доступно только администратору'}), 403
+    if len(creates) + len(updates) + len(deletes) > Config.BULK_MAX_ITEMS:
+        return jsonify({'error': f'Не более {Config.BULK_MAX_ITEMS} элементов за запрос'}), 400
+    
+    results = {'create': [None] * len(creates), 'update': [None] * len(updates), 'delete': [None] * len(deletes)}
+    
+    # Validate and group items by the fields they set
+    groups = {'create': {}, 'update': {}}
+    for kind, items in (('create', creates), ('update', updates)):
+        for index, item in enumerate(items):
+            try:
+                columns, values = prepare_bulk_item(item, fields)
+                if kind == 'create':
+                    columns = ['created_by', 'updated_by'] + columns
+                    values = [current_user.id, current_user.id] + values
+                else:
+                    if not columns:
+                        raise ValueError('Нет полей для обновления')
+                    # Update rows lead with the object id
+                    columns = ['updated_by'] + columns
+                    values = [int(item['id']), current_user.id] + values
+            except (KeyError, TypeError, ValueError) as e:
+                results[kind][index] = {'ok': False, 'error': f'Некорректные данные: {e}'}
+                continue
+            groups[kind].setdefault(tuple(columns), []).append((index, tuple(values)))
+    
+    delete_ids = []
+    for index, object_id in enumerate(deletes):
+        try:
+            delete_ids.append((index, int(object_id)))
+        except (TypeError, ValueError):
+            results['delete'][index] = {'ok': False, 'error': 'Некорректный id'}
+    
+    def failed():
+        return any(r and not r['ok'] for kind_results in results.values() for r in kind_results)
+    
+    if mode == 'atomic' and failed():
+        return jsonify({'applied': False, 'results': results}), 400
+    
+    def run(kind, columns, batch):
+        """Apply one batch; returns {index: result}"""
+        if kind == 'create':
+            ids = bulk_insert(cur, table, list(columns), [values for _, values in batch])
+            return {index: {'id': new_id, 'ok': True} for (index, _), new_id in zip(batch, ids)}
+        if kind == 'update':
+            found = bulk_update(cur, table, list(columns), [values for _, values in batch])
+            keys = [(index, values[0]) for index, values in batch]
+        else:
+            found = bulk_delete(cur, object_type, table, [object_id for _, object_id in batch])
+            keys = batch
+        return {
+            index: {'id': object_id, 'ok': True} if object_id in found
+            else {'id': object_id, 'ok': False, 'error': 'Объект не найден'}
+            for index, object_id in keys
+        }
+    
+    batches = [('create', columns, batch) for columns, batch in groups['create'].items()] + \
+              [('update', columns, batch) for columns, batch in groups['update'].items()]
+    if delete_ids:
+        batches.append(('delete', None, delete_ids))
+    
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        
+        touched = [values[0] for batch in groups['update'].values() for _, values in batch] + \
+                  [object_id for _, object_id in delete_ids]
+        old_bounds = get_objects_bounds(table, touched) if object_type in MAP_LAYERS else []
+        
+        for kind, columns, batch in batches:
+            if mode == 'atomic':
+                outcome = run(kind, columns, batch)
+            else:
+                cur.execute("SAVEPOINT bulk_batch")
+                try:
+                    outcome = run(kind, columns, batch)
+                    cur.execute("RELEASE SAVEPOINT bulk_batch")
+                except psycopg2.Error:
+                    # Isolate the failing items
+                    cur.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+                    outcome = {}
+                    for item in batch:
+                        cur.execute("SAVEPOINT bulk_item")
+                        try:
+                            outcome.update(run(kind, columns, [item]))
+                            cur.execute("RELEASE SAVEPOINT bulk_item")
+                        except psycopg2.Error as e:
+                            cur.execute("ROLLBACK TO SAVEPOINT bulk_item")
+                            outcome[item[0]] = {'ok': False, 'error': str(e).strip()}
+            for index, result in outcome.items():
+                results[kind][index] = result
+        
+        if mode == 'atomic' and failed():
+            conn.rollback()
+            cur.close()
+            return jsonify({'applied': False, 'results': results}), 400
+        
+        written = [r['id'] for kind in ('create', 'update') for r in results[kind] if r and r['ok']]
+        new_bounds = get_objects_bounds(table, written) if object_type in MAP_LAYERS else []
+        conn.commit()
+        cur.close()
+    except psycopg2.Error as e:
+        get_db().rollback()
+        return jsonify({'applied': False, 'error': str(e).strip()}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    bounds = old_bounds + new_bounds
+    if len(bounds) > Config.BULK_TILE_INVALIDATE_LIMIT:
+        tile_cache.clear(object_type)
+    else:
+        invalidate_tiles(object_type, *bounds)
+    
+    summary = {kind: sum(1 for r in kind_results if r and r['ok']) for kind, kind_results in results.items()}
+    return jsonify({'applied': True, 'summary': summary, 'results': results})
+
 # ============================================
 # API - PHOTOS
 # ============================================
@@ -677,7 +2276,6 @@ def upload_photo(object_type, object_id):
         conn.commit()
         
         cur.close()
-        conn.close()
         
         return jsonify({'id': photo_id, 'file_path': file_info['file_path']}), 201
     except Exception as e:
@@ -710,7 +2308,6 @@ def get_users():
         """)
         data = cur.fetchall()
         cur.close()
-        conn.close()
         return jsonify(data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -747,7 +2344,6 @@ def create_user():
         conn.commit()
         
         cur.close()
-        conn.close()
         
         return jsonify({'id': new_id, 'message': 'Пользователь создан'}), 201
     except Exception as e:
@@ -789,8 +2385,11 @@ def update_user(user_id):
         cur.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = %s", values)
         conn.commit()
         
+        # Role changes and deactivation apply at once in this worker; others
+        # pick them up from the users version within USER_VERSION_CHECK_INTERVAL
+        user_cache.invalidate(user_id)
+        
         cur.close()
-        conn.close()
         
         return jsonify({'message': 'Пользователь обновлён'})
     except Exception as e:
@@ -802,16 +2401,11 @@ def update_user(user_id):
 
 @app.route('/api/owners', methods=['GET', 'POST'])
 @login_required
+@etag_versioned(lambda: ['owners'])
 def owners():
     if request.method == 'GET':
         try:
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("SELECT * FROM owners ORDER BY organization_name")
-            data = cur.fetchall()
-            cur.close()
-            conn.close()
-            return jsonify(data)
+            return jsonify(cached_reference('owners_by_name', ['owners'], OWNERS_QUERY))
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -832,28 +2426,18 @@ def owners():
             new_id = cur.fetchone()['id']
             conn.commit()
             cur.close()
-            conn.close()
+            invalidate_references()
             return jsonify({'id': new_id}), 201
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
 @app.route('/api/contracts', methods=['GET', 'POST'])
 @login_required
+@etag_versioned(lambda: ['contracts', 'owners'])
 def contracts():
     if request.method == 'GET':
         try:
-            conn = get_db()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute("""
-                SELECT c.*, o.organization_name as owner_name
-                FROM contracts c
-                LEFT JOIN owners o ON c.owner_id = o.id
-                ORDER BY c.contract_date DESC
-            """)
-            data = cur.fetchall()
-            cur.close()
-            conn.close()
-            return jsonify(data)
+            return jsonify(cached_reference('contracts_with_owner', ['contracts', 'owners'], CONTRACTS_QUERY))
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -874,7 +2458,7 @@ def contracts():
             new_id = cur.fetchone()['id']
             conn.commit()
             cur.close()
-            conn.close()
+            invalidate_references()
             return jsonify({'id': new_id}), 201
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -883,6 +2467,15 @@ def contracts():
 # API - IMPORT
 # ============================================
 
+def import_options():
+    """Import mode of an import request (mode=insert|upsert)"""
+    return {'mode': request.form.get('mode', 'insert')}
+
+def invalidate_imported_tiles(object_type, result):
+    """Drop the cached tiles of a layer an import wrote to"""
+    if result.get('imported') and object_type in MAP_LAYERS:
+        tile_cache.clear(object_type)
+
 @app.route('/api/import/csv', methods=['POST'])
 @login_required
 def import_csv():
@@ -908,12 +2501,13 @@ def import_csv():
         # Import using utility class
         conn = get_db()
         importer = CSVImporter(conn)
-        result = importer.import_data(temp_path, object_type, mapping, current_user.id)
-        conn.close()
+        result = importer.import_data(temp_path, object_type, mapping, current_user.id, **import_options())
         
         # Clean up temp file
         os.remove(temp_path)
         
+        invalidate_imported_tiles(object_type, result)
+        
         # Log import
         log_import(file.filename, 'csv', result)
         
@@ -957,13 +2551,14 @@ def import_tab():
         # Import using utility class
         conn = get_db()
         importer = MapInfoImporter(conn)
-        result = importer.import_from_tab(tab_path, object_type, mapping, current_user.id)
-        conn.close()
+        result = importer.import_from_tab(tab_path, object_type, mapping, current_user.id, **import_options())
         
         # Clean up temp files
         import shutil
         shutil.rmtree(temp_dir)
         
+        invalidate_imported_tiles(object_type, result)
+        
         # Log import
         log_import(os.path.basename(tab_path), 'tab', result)
         
@@ -996,12 +2591,13 @@ def import_geojson():
         # Import using utility class
         conn = get_db()
         importer = GeoJSONImporter(conn)
-        result = importer.import_from_geojson(temp_path, object_type, mapping, current_user.id)
-        conn.close()
+        result = importer.import_from_geojson(temp_path, object_type, mapping, current_user.id, **import_options())
         
         # Clean up temp file
         os.remove(temp_path)
         
+        invalidate_imported_tiles(object_type, result)
+        
         # Log import
         log_import(file.filename, 'geojson', result)
         
@@ -1013,6 +2609,9 @@ def log_import(filename, file_type, result):
     """Log import operation to database"""
     try:
         conn = get_db()
+        # The importer shares this request's connection; clear a failed transaction first
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            conn.rollback()
         cur = conn.cursor()
         cur.execute("""
             INSERT INTO import_logs (filename, file_type, status, total_records, 
@@ -1022,7 +2621,7 @@ def log_import(filename, file_type, result):
             filename, 
             file_type,
             'completed' if 'error' not in result else 'failed',
-            result.get('imported', 0) + result.get('failed', 0),
+            result.get('imported', 0) + result.get('unchanged', 0) + result.get('failed', 0),
             result.get('imported', 0),
             result.get('failed', 0),
             json.dumps(result.get('errors', []), ensure_ascii=False),
@@ -1030,7 +2629,8 @@ def log_import(filename, file_type, result):
         ))
         conn.commit()
         cur.close()
-        conn.close()
+        # Imports are the largest source of change log entries
+        prune_change_log()
     except Exception as e:
         print(f"Error logging import: {e}")
 
@@ -1038,38 +2638,104 @@ def log_import(filename, file_type, result):
 # API - STATISTICS
 # ============================================
 
+# Tables counted by the trigger-maintained object_counts summary
+STATS_TABLES = ['wells', 'marker_posts', 'channel_directions', 'cable_channels',
+                'ground_cables', 'aerial_cables', 'duct_cables']
+
+def stats_tables():
+    """Tables the dashboard statistics are built from"""
+    if request.args.get('estimate') == '1':
+        return None
+    return STATS_TABLES + ['ref_object_states', 'owners']
+
 @app.route('/api/stats')
 @login_required
+@etag_versioned(stats_tables)
 def get_stats():
-    """Get dashboard statistics"""
+    """
+    Get dashboard statistics
+    
+    Totals and per-state/per-owner breakdowns come from the object_counts
+    summary kept by triggers, cached until an object table changes. With
+    estimate=1 only totals are returned, taken from planner statistics.
+    """
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        stats = {}
-        
-        # Count objects
-        tables = ['wells', 'marker_posts', 'channel_directions', 'ground_cables', 'aerial_cables', 'duct_cables']
-        for table in tables:
-            cur.execute(f"SELECT COUNT(*) as count FROM {table}")
-            stats[table] = cur.fetchone()['count']
-        
-        # Count by state
-        cur.execute("""
-            SELECT os.name, COUNT(w.id) as count
-            FROM ref_object_states os
-            LEFT JOIN wells w ON w.state_id = os.id
-            GROUP BY os.id, os.name
-        """)
-        stats['wells_by_state'] = cur.fetchall()
+        if request.args.get('estimate') == '1':
+            cur = get_db().cursor()
+            cur.execute("""
+                SELECT c.relname, GREATEST(c.reltuples, 0)::bigint
+                FROM pg_class c
+                WHERE c.oid = ANY(%s::regclass[])
+            """, (STATS_TABLES,))
+            stats = dict(cur.fetchall())
+            cur.close()
+            stats['estimated'] = True
+            return jsonify(stats)
+        
+        rows = cached_reference('object_counts', STATS_TABLES,
+                                "SELECT table_name, state_id, owner_id, count FROM object_counts WHERE count <> 0")
+        state_names = reference_lookup('ref_object_states', 'name')
+        state_colors = reference_lookup('ref_object_states', 'color')
+        owner_names = reference_lookup('owners', 'organization_name')
+        
+        stats = {table: 0 for table in STATS_TABLES}
+        by_state = {table: {} for table in STATS_TABLES}
+        by_owner = {table: {} for table in STATS_TABLES}
+        for row in rows:
+            table = row['table_name']
+            if table not in stats:
+                continue
+            stats[table] += row['count']
+            by_state[table][row['state_id']] = by_state[table].get(row['state_id'], 0) + row['count']
+            by_owner[table][row['owner_id']] = by_owner[table].get(row['owner_id'], 0) + row['count']
+        
+        # 0 in the summary stands for "not set"
+        stats['by_state'] = {
+            table: [{'state_id': state_id or None,
+                     'name': state_names.get(str(state_id)),
+                     'color': state_colors.get(str(state_id)),
+                     'count': count}
+                    for state_id, count in sorted(counts.items())]
+            for table, counts in by_state.items()
+        }
+        stats['by_owner'] = {
+            table: [{'owner_id': owner_id or None,
+                     'name': owner_names.get(str(owner_id)),
+                     'count': count}
+                    for owner_id, count in sorted(counts.items())]
+            for table, counts in by_owner.items()
+        }
         
-        cur.close()
-        conn.close()
+        # Every state, including those without wells
+        stats['wells_by_state'] = [
+            {'name': name, 'count': by_state['wells'].get(int(state_id), 0)}
+            for state_id, name in state_names.items()
+        ]
         
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats/db-pool')
+@login_required
+@admin_required
+def get_db_pool_stats():
+    """Get database connection pool statistics (admin only)"""
+    return jsonify(db_pool.stats())
+
+@app.route('/api/stats/cache')
+@login_required
+@admin_required
+def get_cache_stats():
+    """Get in-process cache statistics (admin only)"""
+    return jsonify({
+        'users': user_cache.stats(),
+        'tiles': tile_cache.stats(),
+        'responses': response_cache.stats(),
+        'references': reference_cache.stats(),
+        'network': duct_network.stats()
+    })
+
 # ============================================
 # MAIN
 # ============================================
@@ -0,0 +1,341 @@
+"""
+ИГС Portal - In-Process Caches
+"""
+
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return cached value or None if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store value, evicting the least recently used entries over max_size"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class TileCache:
+    """
+    On-disk cache of vector tiles laid out as <root>/<layer>/<crs>/<z>/<x>/<y>.pbf
+
+    Tiles use the Web Mercator z/x/y grid, so the tiles touched by an edit can be
+    found from the edited geometry's WGS84 bounds. The <crs> directory name may
+    carry a version suffix; bounds invalidation covers every such directory.
+    """
+
+    MAX_LAT = 85.0511287798
+
+    def __init__(self, root: str, max_zoom: int = 22, buffer: float = 0.0):
+        self.root = root
+        self.max_zoom = max_zoom
+        self.buffer = buffer  # tile buffer as a fraction of the tile size
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, layer: str, crs: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, layer, crs, str(z), str(x), f'{y}.pbf')
+
+    def get(self, layer: str, crs: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """Return cached tile bytes or None"""
+        try:
+            with open(self._path(layer, crs, z, x, y), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, layer: str, crs: str, z: int, x: int, y: int, data: bytes):
+        """Store tile bytes (written atomically)"""
+        path = self._path(layer, crs, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _tile_xy(self, lon: float, lat: float, z: int) -> Tuple[float, float]:
+        """Fractional tile coordinates of a WGS84 point"""
+        lat = max(-self.MAX_LAT, min(self.MAX_LAT, lat))
+        n = 2 ** z
+        x = (lon + 180.0) / 360.0 * n
+        lat_rad = math.radians(lat)
+        y = (1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * n
+        return x, y
+
+    def invalidate_bounds(self, layer: str, bounds: Tuple[float, float, float, float]):
+        """Remove cached tiles of a layer (all CRSs) that overlap WGS84 bounds"""
+        min_lon, min_lat, max_lon, max_lat = bounds
+        layer_dir = os.path.join(self.root, layer)
+        if not os.path.isdir(layer_dir):
+            return
+
+        for crs in os.listdir(layer_dir):
+            for z in range(self.max_zoom + 1):
+                zoom_dir = os.path.join(layer_dir, crs, str(z))
+                if not os.path.isdir(zoom_dir):
+                    continue
+
+                n = 2 ** z
+                x0, y0 = self._tile_xy(min_lon, max_lat, z)
+                x1, y1 = self._tile_xy(max_lon, min_lat, z)
+                x_min = max(0, int(math.floor(x0 - self.buffer)))
+                x_max = min(n - 1, int(math.floor(x1 + self.buffer)))
+                y_min = max(0, int(math.floor(y0 - self.buffer)))
+                y_max = min(n - 1, int(math.floor(y1 + self.buffer)))
+
+                for x_name in os.listdir(zoom_dir):
+                    if not x_name.isdigit() or not x_min <= int(x_name) <= x_max:
+                        continue
+                    x_dir = os.path.join(zoom_dir, x_name)
+                    for y_name in os.listdir(x_dir):
+                        y_str = y_name[:-4] if y_name.endswith('.pbf') else ''
+                        if y_str.isdigit() and y_min <= int(y_str) <= y_max:
+                            try:
+                                os.remove(os.path.join(x_dir, y_name))
+                            except OSError:
+                                pass
+
+    def clear(self, layer: Optional[str] = None):
+        """Remove all cached tiles, or those of one layer"""
+        path = os.path.join(self.root, layer) if layer else self.root
+        shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class CompressedBodyBuilder:
+    """Incrementally gzip/brotli-compress a response body as it is produced"""
+
+    def __init__(self, max_bytes: int, level: int = 6):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.overflow = False
+        self._gzip = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self._gzip_parts = []
+        self._brotli = brotli.Compressor(quality=min(level, 11)) if brotli else None
+        self._brotli_parts = []
+
+    def feed(self, chunk: bytes):
+        """Add a chunk of the uncompressed body"""
+        if self.overflow:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            # Too large to cache; drop what was collected
+            self.overflow = True
+            self._gzip_parts = []
+            self._brotli_parts = []
+            return
+        self._gzip_parts.append(self._gzip.compress(chunk))
+        if self._brotli:
+            self._brotli_parts.append(self._brotli.process(chunk))
+
+    def finish(self) -> Optional[Dict]:
+        """Return the compressed bodies, or None if the body overflowed"""
+        if self.overflow:
+            return None
+        self._gzip_parts.append(self._gzip.flush())
+        entry = {'size': self.size, 'gzip': b''.join(self._gzip_parts), 'br': None}
+        if self._brotli:
+            self._brotli_parts.append(self._brotli.finish())
+            entry['br'] = b''.join(self._brotli_parts)
+        return entry
+
+
+class CompressedResponseCache:
+    """
+    LRU cache of precompressed response bodies bounded by total byte size
+
+    Entries are dicts with the uncompressed 'size', the 'gzip' body, the
+    'br' body (None without the brotli package) and the 'mimetype'.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: 'OrderedDict[Hashable, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def _entry_bytes(entry: Dict) -> int:
+        return len(entry['gzip']) + len(entry['br'] or b'')
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Return the cached entry or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: Dict):
+        """Store an entry, evicting least recently used ones over the budget"""
+        entry_bytes = self._entry_bytes(entry)
+        if entry_bytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total_bytes -= self._entry_bytes(old)
+            self._data[key] = entry
+            self.total_bytes += entry_bytes
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.total_bytes -= self._entry_bytes(evicted)
+
+    def record_served(self, uncompressed: int, sent: int):
+        """Account bytes not sent thanks to compression"""
+        with self._lock:
+            self.bytes_saved += max(0, uncompressed - sent)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict:
+        """Return hit ratio and byte counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'brotli': brotli is not None
+            }
+
+
+class VersionedCache:
+    """
+    Cache of values that stay valid until their version stamp changes
+
+    The caller supplies the current version on every lookup; a different
+    version than the stored one reloads the value through `loader`.
+    """
+
+    def __init__(self):
+        self._data: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, key: Hashable, version: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the value for key at version, loading it if stale or missing"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+
+        value = loader()
+        with self._lock:
+            self._data[key] = (version, value)
+            self.loads += 1
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or all entries"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> Dict:
+        """Return hit/load counters"""
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                'entries': len(self._data),
+                'hits': self.hits,
+                'loads': self.loads,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -11,7 +11,23 @@ class Config:
     DB_PASSWORD = os.environ.get('DB_PASSWORD', 'lksoftGwebsrv')
     
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+    # Connection pool
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '20'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))  # seconds to wait for a free connection
+    DB_POOL_HEALTHCHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', '30'))  # idle seconds before re-check
+
+    # Authenticated user cache
+    USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '1000'))
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '300'))  # seconds
+    USER_VERSION_CHECK_INTERVAL = float(os.environ.get('USER_VERSION_CHECK_INTERVAL', '5'))  # seconds between users/ref_roles version reads
     
+    # Compressed response cache (GeoJSON and object lists)
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))  # compressed bytes
+    RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRY_BYTES', str(64 * 1024 * 1024)))  # uncompressed body
+    RESPONSE_COMPRESSION_LEVEL = 6
+
     # Upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -21,6 +37,39 @@ class Config:
     SRID_WGS84 = 4326
     SRID_MSK86_ZONE4 = 2502  # МСК-86 зона 4 (приблизительный EPSG код)
     
+    # Map layer requests
+    MAP_MAX_FEATURES = int(os.environ.get('MAP_MAX_FEATURES', '10000'))  # hard limit per layer response
+    MAP_MAX_ZOOM = 22
+    MAP_MIN_LINE_PIXELS = 1  # lines smaller than this on screen are skipped when zoom is given
+    MAP_SIMPLIFY_PIXELS = 0.5  # line simplification tolerance in screen pixels
+    MAP_MAX_DECIMAL_DIGITS = 9  # ST_AsGeoJSON default precision
+    MAP_CLUSTER_MAX_ZOOM = int(os.environ.get('MAP_CLUSTER_MAX_ZOOM', '15'))  # wells/marker posts are clustered below this zoom
+    MAP_CLUSTER_CELL_PIXELS = 60  # cluster grid cell size in screen pixels
+    GEOJSON_STREAM_CHUNK_SIZE = int(os.environ.get('GEOJSON_STREAM_CHUNK_SIZE', '2000'))  # rows per fetch
+    SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', '5000'))  # above this /api/changes asks for a full reload
+    CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', '14'))  # older watermarks get a full reload
+    CHANGE_LOG_PRUNE_INTERVAL = 3600  # seconds between change log prunes per worker
+    
+    # Search
+    SEARCH_DEFAULT_K = 10  # results when the request has no k=
+    SEARCH_MAX_K = 100
+    SEARCH_MAX_RADIUS = int(os.environ.get('SEARCH_MAX_RADIUS', '10000'))  # metres
+    SEARCH_MAX_RESULTS = 50  # hard limit for /api/search
+    
+    # Object list pagination
+    OBJECTS_PAGE_SIZE = 500  # default /api/objects/<type> page size
+    OBJECTS_MAX_PAGE_SIZE = int(os.environ.get('OBJECTS_MAX_PAGE_SIZE', '5000'))
+    
+    # Bulk object edits
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '10000'))  # creates + updates + deletes per request
+    BULK_PAGE_SIZE = 1000  # rows per execute_values statement
+    BULK_TILE_INVALIDATE_LIMIT = 100  # above this many objects the layer's tile cache is cleared
+    
+    # Vector tiles
+    TILE_CACHE_FOLDER = os.environ.get('TILE_CACHE_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tile_cache')
+    TILE_EXTENT = 4096
+    TILE_BUFFER = 64
+    
     # Default admin credentials
     DEFAULT_ADMIN_LOGIN = 'root'
     DEFAULT_ADMIN_PASSWORD = 'Kolobaha00!'
@@ -6,6 +6,9 @@
 -- Enable PostGIS extension
 CREATE EXTENSION IF NOT EXISTS postgis;
 
+-- Trigram indexes for object number search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ============================================
 -- 1. СПРАВОЧНИКИ (Reference Tables)
 -- ============================================
@@ -258,6 +261,8 @@ CREATE INDEX IF NOT EXISTS idx_wells_geom_msk86 ON wells USING GIST(geom_msk86);
 CREATE INDEX IF NOT EXISTS idx_wells_owner ON wells(owner_id);
 CREATE INDEX IF NOT EXISTS idx_wells_type ON wells(well_type_id);
 CREATE INDEX IF NOT EXISTS idx_wells_state ON wells(state_id);
+CREATE INDEX IF NOT EXISTS idx_wells_updated ON wells(updated_at);
+CREATE INDEX IF NOT EXISTS idx_wells_number_trgm ON wells USING GIN(number gin_trgm_ops);
 
 -- 4.2 Направления канала кабельной канализации
 CREATE TABLE IF NOT EXISTS channel_directions (
@@ -288,6 +293,9 @@ CREATE INDEX IF NOT EXISTS idx_ch_dir_geom_wgs84 ON channel_directions USING GIS
 CREATE INDEX IF NOT EXISTS idx_ch_dir_geom_msk86 ON channel_directions USING GIST(geom_msk86);
 CREATE INDEX IF NOT EXISTS idx_ch_dir_start_well ON channel_directions(start_well_id);
 CREATE INDEX IF NOT EXISTS idx_ch_dir_end_well ON channel_directions(end_well_id);
+CREATE INDEX IF NOT EXISTS idx_ch_dir_owner ON channel_directions(owner_id);
+CREATE INDEX IF NOT EXISTS idx_ch_dir_updated ON channel_directions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_ch_dir_number_trgm ON channel_directions USING GIN(number gin_trgm_ops);
 
 -- 4.3 Каналы кабельной канализации (до 16 на направление)
 CREATE TABLE IF NOT EXISTS cable_channels (
@@ -309,6 +317,8 @@ CREATE TABLE IF NOT EXISTS cable_channels (
 
 CREATE INDEX IF NOT EXISTS idx_cable_ch_direction ON cable_channels(channel_direction_id);
 CREATE INDEX IF NOT EXISTS idx_cable_ch_type ON cable_channels(channel_type_id);
+CREATE INDEX IF NOT EXISTS idx_cable_ch_state ON cable_channels(state_id);
+CREATE INDEX IF NOT EXISTS idx_cable_ch_updated ON cable_channels(updated_at);
 
 -- 4.4 Указательные столбики
 CREATE TABLE IF NOT EXISTS marker_posts (
@@ -335,6 +345,11 @@ CREATE TABLE IF NOT EXISTS marker_posts (
 
 CREATE INDEX IF NOT EXISTS idx_marker_geom_wgs84 ON marker_posts USING GIST(geom_wgs84);
 CREATE INDEX IF NOT EXISTS idx_marker_geom_msk86 ON marker_posts USING GIST(geom_msk86);
+CREATE INDEX IF NOT EXISTS idx_marker_owner ON marker_posts(owner_id);
+CREATE INDEX IF NOT EXISTS idx_marker_type ON marker_posts(marker_type_id);
+CREATE INDEX IF NOT EXISTS idx_marker_state ON marker_posts(state_id);
+CREATE INDEX IF NOT EXISTS idx_marker_updated ON marker_posts(updated_at);
+CREATE INDEX IF NOT EXISTS idx_marker_number_trgm ON marker_posts USING GIN(number gin_trgm_ops);
 
 -- 4.5 Кабель в грунте
 CREATE TABLE IF NOT EXISTS ground_cables (
@@ -362,6 +377,11 @@ CREATE TABLE IF NOT EXISTS ground_cables (
 
 CREATE INDEX IF NOT EXISTS idx_ground_cable_geom_wgs84 ON ground_cables USING GIST(geom_wgs84);
 CREATE INDEX IF NOT EXISTS idx_ground_cable_geom_msk86 ON ground_cables USING GIST(geom_msk86);
+CREATE INDEX IF NOT EXISTS idx_ground_cable_owner ON ground_cables(owner_id);
+CREATE INDEX IF NOT EXISTS idx_ground_cable_type ON ground_cables(cable_type_id);
+CREATE INDEX IF NOT EXISTS idx_ground_cable_state ON ground_cables(state_id);
+CREATE INDEX IF NOT EXISTS idx_ground_cable_updated ON ground_cables(updated_at);
+CREATE INDEX IF NOT EXISTS idx_ground_cable_number_trgm ON ground_cables USING GIN(number gin_trgm_ops);
 
 -- 4.6 Кабель воздушными переходами
 CREATE TABLE IF NOT EXISTS aerial_cables (
@@ -389,6 +409,11 @@ CREATE TABLE IF NOT EXISTS aerial_cables (
 
 CREATE INDEX IF NOT EXISTS idx_aerial_cable_geom_wgs84 ON aerial_cables USING GIST(geom_wgs84);
 CREATE INDEX IF NOT EXISTS idx_aerial_cable_geom_msk86 ON aerial_cables USING GIST(geom_msk86);
+CREATE INDEX IF NOT EXISTS idx_aerial_cable_owner ON aerial_cables(owner_id);
+CREATE INDEX IF NOT EXISTS idx_aerial_cable_type ON aerial_cables(cable_type_id);
+CREATE INDEX IF NOT EXISTS idx_aerial_cable_state ON aerial_cables(state_id);
+CREATE INDEX IF NOT EXISTS idx_aerial_cable_updated ON aerial_cables(updated_at);
+CREATE INDEX IF NOT EXISTS idx_aerial_cable_number_trgm ON aerial_cables USING GIN(number gin_trgm_ops);
 
 -- 4.7 Кабель в кабельной канализации
 CREATE TABLE IF NOT EXISTS duct_cables (
@@ -416,6 +441,11 @@ CREATE TABLE IF NOT EXISTS duct_cables (
 
 CREATE INDEX IF NOT EXISTS idx_duct_cable_geom_wgs84 ON duct_cables USING GIST(geom_wgs84);
 CREATE INDEX IF NOT EXISTS idx_duct_cable_geom_msk86 ON duct_cables USING GIST(geom_msk86);
+CREATE INDEX IF NOT EXISTS idx_duct_cable_owner ON duct_cables(owner_id);
+CREATE INDEX IF NOT EXISTS idx_duct_cable_type ON duct_cables(cable_type_id);
+CREATE INDEX IF NOT EXISTS idx_duct_cable_state ON duct_cables(state_id);
+CREATE INDEX IF NOT EXISTS idx_duct_cable_updated ON duct_cables(updated_at);
+CREATE INDEX IF NOT EXISTS idx_duct_cable_number_trgm ON duct_cables USING GIN(number gin_trgm_ops);
 
 -- Связь кабеля с каналами (многие ко многим)
 CREATE TABLE IF NOT EXISTS duct_cable_channels (
@@ -492,6 +522,62 @@ CREATE TABLE IF NOT EXISTS import_logs (
     created_by INTEGER REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- Natural key and content hash of imported objects; upsert imports
+-- match rows on import_key and skip those whose import_hash is unchanged.
+-- Objects that were never imported or adopted keep import_key NULL.
+
+-- Canonical import key; arguments are typed, so '101' and 101 give the same key
+-- (declared IMMUTABLE for the index below: text and integer output never changes)
+CREATE OR REPLACE FUNCTION object_import_key(p_number TEXT, p_owner_id INTEGER)
+RETURNS TEXT AS $$
+    SELECT jsonb_build_array(p_number, p_owner_id)::text
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Keep the key of keyed objects in step with number/owner_id on every write.
+-- A key already held by another object is dropped rather than duplicated.
+CREATE OR REPLACE FUNCTION set_import_key()
+RETURNS TRIGGER AS $$
+DECLARE
+    new_key TEXT;
+    taken BOOLEAN;
+BEGIN
+    IF NEW.import_key IS NULL THEN
+        RETURN NEW;
+    END IF;
+    new_key := object_import_key(NEW.number, NEW.owner_id);
+    IF TG_OP = 'UPDATE' AND new_key IS DISTINCT FROM OLD.import_key THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE import_key = $1 AND id <> $2)', TG_TABLE_NAME)
+            INTO taken USING new_key, NEW.id;
+        IF taken THEN
+            new_key := NULL;
+        END IF;
+    END IF;
+    NEW.import_key := new_key;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY[
+        'wells', 'channel_directions', 'marker_posts',
+        'ground_cables', 'aerial_cables', 'duct_cables'
+    ] LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS import_key TEXT,
+                                     ADD COLUMN IF NOT EXISTS import_hash VARCHAR(32)', tbl);
+        EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I(import_key)', 'idx_' || tbl || '_import_key', tbl);
+        -- Unkeyed objects by key, for adoption by upsert imports
+        EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I(object_import_key(number, owner_id))
+                        WHERE import_key IS NULL', 'idx_' || tbl || '_unkeyed', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_import_key ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_import_key
+                            BEFORE INSERT OR UPDATE ON %I
+                            FOR EACH ROW EXECUTE FUNCTION set_import_key()', tbl);
+    END LOOP;
+END $$;
+
 -- ============================================
 -- 7. ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 -- ============================================
@@ -557,7 +643,274 @@ CREATE TRIGGER trigger_sync_geom_duct
     FOR EACH ROW EXECUTE FUNCTION sync_geometries();
 
 -- ============================================
--- 8. ПРЕДСТАВЛЕНИЯ ДЛЯ КАРТЫ
+-- 8. ВЕРСИИ ДАННЫХ И ЖУРНАЛ ИЗМЕНЕНИЙ (ETag, синхронизация)
+-- ============================================
+
+CREATE SEQUENCE IF NOT EXISTS data_version_seq;
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tables modified by open transactions. Updating data_versions directly from
+-- every statement would lock the table's row until commit and serialize all
+-- writers behind e.g. a long import; instead each statement only records a
+-- per-transaction marker (no contention between transactions) and the
+-- version is bumped once per table when the transaction commits.
+CREATE UNLOGGED TABLE IF NOT EXISTS data_version_pending (
+    txid BIGINT NOT NULL,
+    table_name VARCHAR(63) NOT NULL,
+    PRIMARY KEY (txid, table_name)
+);
+
+-- Statement trigger on data tables: mark the table as modified
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO data_version_pending (txid, table_name)
+    VALUES (txid_current(), TG_TABLE_NAME)
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deferred to commit: the data_versions row is locked only while the
+-- transaction commits. Versions are compared for equality only, so
+-- concurrent commits may store them out of sequence order.
+CREATE OR REPLACE FUNCTION publish_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO data_versions (table_name, version)
+    VALUES (NEW.table_name, nextval('data_version_seq'))
+    ON CONFLICT (table_name) DO UPDATE
+        SET version = EXCLUDED.version, updated_at = CURRENT_TIMESTAMP;
+    DELETE FROM data_version_pending WHERE txid = NEW.txid AND table_name = NEW.table_name;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_publish_data_version ON data_version_pending;
+CREATE CONSTRAINT TRIGGER trigger_publish_data_version
+    AFTER INSERT ON data_version_pending
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION publish_data_version();
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY[
+        'ref_roles', 'ref_object_kinds', 'ref_well_types', 'ref_channel_types',
+        'ref_cable_types', 'ref_marker_post_types', 'ref_object_states',
+        'owners', 'contracts',
+        'wells', 'channel_directions', 'cable_channels', 'marker_posts',
+        'ground_cables', 'aerial_cables', 'duct_cables', 'duct_cable_channels',
+        'object_photos'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_data_version ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_data_version
+                            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                            FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', tbl);
+        INSERT INTO data_versions (table_name, version)
+        VALUES (tbl, nextval('data_version_seq'))
+        ON CONFLICT (table_name) DO NOTHING;
+    END LOOP;
+END $$;
+
+-- users: only columns the cached login user depends on, so last_login
+-- updates on every sign-in do not invalidate the user cache
+DROP TRIGGER IF EXISTS trigger_data_version ON users;
+CREATE TRIGGER trigger_data_version
+    AFTER INSERT OR DELETE OR TRUNCATE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+DROP TRIGGER IF EXISTS trigger_data_version_update ON users;
+CREATE TRIGGER trigger_data_version_update
+    AFTER UPDATE OF username, full_name, role_id, is_active ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version();
+INSERT INTO data_versions (table_name, version)
+VALUES ('users', nextval('data_version_seq'))
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Row-level change log for delta sync of map objects
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    table_name VARCHAR(63) NOT NULL,
+    object_id INTEGER NOT NULL,
+    operation CHAR(1) NOT NULL, -- U (insert/update), D (delete)
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_txid ON change_log(txid);
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);
+
+-- Entries older than the retention period are pruned by prune_change_log();
+-- sync watermarks below pruned_txid can no longer be served incrementally
+CREATE TABLE IF NOT EXISTS change_log_horizon (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_txid BIGINT NOT NULL DEFAULT 0,
+    pruned_at TIMESTAMP
+);
+
+INSERT INTO change_log_horizon (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION prune_change_log(keep INTERVAL)
+RETURNS BIGINT AS $$
+DECLARE
+    pruned BIGINT;
+    last_txid BIGINT;
+BEGIN
+    WITH deleted AS (
+        DELETE FROM change_log WHERE changed_at < CURRENT_TIMESTAMP - keep RETURNING txid
+    )
+    SELECT count(*), max(txid) INTO pruned, last_txid FROM deleted;
+    IF pruned > 0 THEN
+        UPDATE change_log_horizon
+        SET pruned_txid = GREATEST(pruned_txid, last_txid + 1), pruned_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN pruned;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION log_object_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO change_log (table_name, object_id, operation) VALUES (TG_TABLE_NAME, OLD.id, 'D');
+    ELSE
+        INSERT INTO change_log (table_name, object_id, operation) VALUES (TG_TABLE_NAME, NEW.id, 'U');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY[
+        'wells', 'channel_directions', 'cable_channels', 'marker_posts',
+        'ground_cables', 'aerial_cables', 'duct_cables'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_change_log ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_change_log
+                            AFTER INSERT OR UPDATE OR DELETE ON %I
+                            FOR EACH ROW EXECUTE FUNCTION log_object_change()', tbl);
+    END LOOP;
+END $$;
+
+-- ============================================
+-- 9. СВОДНЫЕ СЧЁТЧИКИ ОБЪЕКТОВ (статистика)
+-- ============================================
+
+-- Number of objects per table, state and owner (0 = не указано)
+CREATE TABLE IF NOT EXISTS object_counts (
+    table_name VARCHAR(63) NOT NULL,
+    state_id INTEGER NOT NULL DEFAULT 0,
+    owner_id INTEGER NOT NULL DEFAULT 0,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name, state_id, owner_id)
+);
+
+-- Apply the net change of a statement using its transition tables
+CREATE OR REPLACE FUNCTION maintain_object_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO object_counts (table_name, state_id, owner_id, count)
+        SELECT TG_TABLE_NAME, d.state_id, d.owner_id, SUM(d.delta)
+        FROM (
+            SELECT COALESCE((to_jsonb(n) ->> 'state_id')::int, 0) as state_id,
+                   COALESCE((to_jsonb(n) ->> 'owner_id')::int, 0) as owner_id, 1 as delta
+            FROM new_rows n
+        ) d
+        GROUP BY d.state_id, d.owner_id
+        ORDER BY d.state_id, d.owner_id
+        ON CONFLICT (table_name, state_id, owner_id) DO UPDATE
+            SET count = object_counts.count + EXCLUDED.count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO object_counts (table_name, state_id, owner_id, count)
+        SELECT TG_TABLE_NAME, d.state_id, d.owner_id, SUM(d.delta)
+        FROM (
+            SELECT COALESCE((to_jsonb(o) ->> 'state_id')::int, 0) as state_id,
+                   COALESCE((to_jsonb(o) ->> 'owner_id')::int, 0) as owner_id, -1 as delta
+            FROM old_rows o
+        ) d
+        GROUP BY d.state_id, d.owner_id
+        ORDER BY d.state_id, d.owner_id
+        ON CONFLICT (table_name, state_id, owner_id) DO UPDATE
+            SET count = object_counts.count + EXCLUDED.count;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Only rows whose state or owner changed move between counters
+        INSERT INTO object_counts (table_name, state_id, owner_id, count)
+        SELECT TG_TABLE_NAME, d.state_id, d.owner_id, SUM(d.delta)
+        FROM (
+            SELECT COALESCE((to_jsonb(n) ->> 'state_id')::int, 0) as state_id,
+                   COALESCE((to_jsonb(n) ->> 'owner_id')::int, 0) as owner_id, 1 as delta
+            FROM new_rows n
+            UNION ALL
+            SELECT COALESCE((to_jsonb(o) ->> 'state_id')::int, 0),
+                   COALESCE((to_jsonb(o) ->> 'owner_id')::int, 0), -1
+            FROM old_rows o
+        ) d
+        GROUP BY d.state_id, d.owner_id
+        HAVING SUM(d.delta) <> 0
+        ORDER BY d.state_id, d.owner_id
+        ON CONFLICT (table_name, state_id, owner_id) DO UPDATE
+            SET count = object_counts.count + EXCLUDED.count;
+    ELSE -- TRUNCATE
+        DELETE FROM object_counts WHERE table_name = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tbl TEXT;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY[
+        'wells', 'channel_directions', 'cable_channels', 'marker_posts',
+        'ground_cables', 'aerial_cables', 'duct_cables'
+    ] LOOP
+        -- Writers wait until the triggers are replaced and the counts seeded,
+        -- so no change is counted twice or missed
+        EXECUTE format('LOCK TABLE %I IN SHARE ROW EXCLUSIVE MODE', tbl);
+        
+        -- Transition tables require one trigger per event
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_object_counts_insert ON %I', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_object_counts_update ON %I', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_object_counts_delete ON %I', tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_object_counts_truncate ON %I', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_object_counts_insert
+                            AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+                            FOR EACH STATEMENT EXECUTE FUNCTION maintain_object_counts()', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_object_counts_update
+                            AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                            FOR EACH STATEMENT EXECUTE FUNCTION maintain_object_counts()', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_object_counts_delete
+                            AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+                            FOR EACH STATEMENT EXECUTE FUNCTION maintain_object_counts()', tbl);
+        EXECUTE format('CREATE TRIGGER trigger_object_counts_truncate
+                            AFTER TRUNCATE ON %I
+                            FOR EACH STATEMENT EXECUTE FUNCTION maintain_object_counts()', tbl);
+        
+        -- Seed the counts once; afterwards the triggers keep them current
+        IF NOT EXISTS (SELECT 1 FROM object_counts WHERE table_name = tbl) THEN
+            EXECUTE format('INSERT INTO object_counts (table_name, state_id, owner_id, count)
+                            SELECT %L, COALESCE((to_jsonb(t) ->> ''state_id'')::int, 0),
+                                   COALESCE((to_jsonb(t) ->> ''owner_id'')::int, 0), COUNT(*)
+                            FROM %I t
+                            GROUP BY 2, 3
+                            ON CONFLICT (table_name, state_id, owner_id) DO NOTHING', tbl, tbl);
+        END IF;
+    END LOOP;
+END $$;
+
+-- ============================================
+-- 10. ПРЕДСТАВЛЕНИЯ ДЛЯ КАРТЫ
 -- ============================================
 
 -- View for all point objects
@@ -0,0 +1,167 @@
+"""
+ИГС Portal - Database Connection Pool
+Thread-safe PostgreSQL connection pool with health checks and usage statistics
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+
+
+class ManagedConnectionPool:
+    """
+    Bounded pool of psycopg2 connections
+
+    Unlike ThreadedConnectionPool, which raises PoolError as soon as maxconn
+    connections are checked out, callers block until a connection is returned
+    (up to `timeout` seconds). Idle connections are validated on checkout.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 30.0,
+                 healthcheck_interval: float = 30.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self._last_used_lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        """Create the underlying pool on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **self.connect_kwargs)
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        """Check that a pooled connection is still usable"""
+        if conn.closed:
+            return False
+
+        with self._last_used_lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _forget(self, conn):
+        """Drop the health-check timestamp of a connection being closed"""
+        with self._last_used_lock:
+            self._last_used.pop(id(conn), None)
+
+    def getconn(self):
+        """Borrow a connection, waiting for a free slot if the pool is exhausted"""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._stats['timeouts'] += 1
+            raise PoolError(f'No database connection available within {self.timeout}s')
+        waited = time.monotonic() - started
+
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            # Every pooled connection may have died (e.g. a database restart);
+            # keep discarding until one passes or the pool opens a new one.
+            # New connections have no _last_used entry, so they are checked too.
+            attempts = 1
+            while not self._is_healthy(conn):
+                self._forget(conn)
+                pool.putconn(conn, close=True)
+                with self._stats_lock:
+                    self._stats['discarded'] += 1
+                if attempts > self.maxconn:
+                    raise PoolError('No healthy database connection available')
+                conn = pool.getconn()
+                attempts += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        pool = self._get_pool()
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+
+            if close or conn.closed:
+                self._forget(conn)
+            else:
+                with self._last_used_lock:
+                    self._last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=close)
+        finally:
+            with self._stats_lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def closeall(self):
+        """Close all connections"""
+        if self._pool is not None:
+            self._pool.closeall()
+            with self._last_used_lock:
+                self._last_used.clear()
+
+    def stats(self) -> Dict:
+        """Return pool usage statistics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        checkouts = stats.pop('checkouts')
+        wait_total = stats.pop('wait_time_total')
+        wait_max = stats.pop('wait_time_max')
+
+        return {
+            'min_size': self.minconn,
+            'max_size': self.maxconn,
+            'checkouts': checkouts,
+            'in_use': stats['in_use'],
+            'timeouts': stats['timeouts'],
+            'discarded': stats['discarded'],
+            'wait_time_total_ms': round(wait_total * 1000, 3),
+            'wait_time_avg_ms': round(wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+            'wait_time_max_ms': round(wait_max * 1000, 3)
+        }
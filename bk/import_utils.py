@@ -4,154 +4,502 @@ Supports CSV and MapInfo TAB/DAT/MAP/ID files
 """
 
 import os
+import io
 import csv
 import struct
 import json
+import hashlib
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, Callable, Sequence
 
 import pandas as pd
+import psycopg2
+from psycopg2.extensions import AsIs
+from psycopg2.extras import execute_values
 from shapely import wkt
 from shapely.geometry import Point, LineString, Polygon, mapping
 
 
+# Rows per INSERT statement in the MapInfo and GeoJSON importers
+INSERT_BATCH_SIZE = 1000
+
+# Value for columns a record does not set, so the column default applies
+DEFAULT = AsIs('DEFAULT')
+
+
+def insert_isolated(cur, items: Sequence, insert: Callable[[Sequence], int],
+                    batch_size: int = INSERT_BATCH_SIZE) -> Tuple[int, List[Tuple[Any, str]]]:
+    """
+    Insert items in batches, each guarded by a savepoint
+    
+    `insert` writes one batch and returns the number of rows inserted. A failed
+    batch is rolled back to its savepoint and split in half until the failing
+    items are isolated, so the rest still loads in batches and the transaction
+    stays usable. Returns (inserted, [(item, error)]).
+    """
+    inserted = 0
+    failures = []
+    pending = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    pending.reverse()
+    
+    while pending:
+        batch = pending.pop()
+        cur.execute("SAVEPOINT import_batch")
+        try:
+            count = insert(batch)
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT import_batch")
+            cur.execute("RELEASE SAVEPOINT import_batch")
+            if len(batch) == 1:
+                failures.append((batch[0], str(e).strip()))
+            else:
+                middle = len(batch) // 2
+                pending.extend([batch[middle:], batch[:middle]])
+            continue
+        cur.execute("RELEASE SAVEPOINT import_batch")
+        inserted += count
+    
+    return inserted, failures
+
+
+# Import modes: plain inserts, or upserts keyed on a natural key
+IMPORT_MODES = ('insert', 'upsert')
+
+# Columns of the upsert key. The key is fixed: object_import_key(number, owner_id)
+# in schema.sql builds import_key from them, so this only lists the columns an
+# upsert import must map and cannot be changed on its own
+_UPSERT_KEY = ('number', 'owner_id')
+
+# Any non-NULL import_key marks a row as keyed; the set_import_key() trigger
+# replaces it with the canonical key
+KEYED = ''
+
+
+def content_hash(content: Any) -> str:
+    """Hash of a record's imported content"""
+    payload = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def adopt_query(table: str, keys: str) -> str:
+    """
+    UPDATE assigning import keys to existing unkeyed objects matching `keys`
+    
+    `keys` is a subquery returning the object_import_key() values of the
+    rows about to be upserted, so objects created by hand or by plain
+    inserts are matched instead of duplicated. Only unkeyed rows with those
+    keys are read (idx_<table>_unkeyed); keys shared by several objects are
+    left unassigned, since they cannot identify a single row.
+    """
+    return f"""
+        UPDATE {table} t SET import_key = '{KEYED}'
+        FROM (
+            SELECT min(u.id) as id
+            FROM {table} u
+            WHERE u.import_key IS NULL
+            AND object_import_key(u.number, u.owner_id) IN ({keys})
+            GROUP BY object_import_key(u.number, u.owner_id)
+            HAVING count(*) = 1
+        ) k
+        WHERE t.id = k.id
+    """
+
+
+def adopt_record_keys(cur, table: str, records: List[Dict]):
+    """Adopt existing objects matching a batch of MapInfo/GeoJSON records"""
+    keys = "SELECT object_import_key(v.number, v.owner_id) FROM (VALUES %s) v(number, owner_id)"
+    execute_values(cur, adopt_query(table, keys), [(r.get('number'), r.get('owner_id')) for r in records],
+                   template='(%s::text, %s::integer)', page_size=len(records))
+
+
+def upsert_clause(table: str, fields: Sequence[str], geometry: bool = False) -> str:
+    """
+    ON CONFLICT clause of upsert imports
+    
+    Rows whose stored content hash matches are left untouched. RETURNING
+    yields one flag per written row: true for inserts, false for updates.
+    """
+    sets = ['updated_by = EXCLUDED.updated_by', 'updated_at = CURRENT_TIMESTAMP',
+            'import_hash = EXCLUDED.import_hash'] + [f'{f} = EXCLUDED.{f}' for f in fields]
+    if geometry:
+        # Cleared so sync_geometries() recomputes it from the new WGS84 geometry
+        sets += ['geom_wgs84 = EXCLUDED.geom_wgs84', 'geom_msk86 = NULL']
+    return f"""
+        ON CONFLICT (import_key) DO UPDATE SET {', '.join(sets)}
+        WHERE {table}.import_hash IS DISTINCT FROM EXCLUDED.import_hash
+        RETURNING (xmax = 0) as inserted
+    """
+
+
+def count_upserted(rows: List[Tuple], results: Dict) -> int:
+    """Add RETURNING flags of an upsert to the inserted/updated counters"""
+    inserted = sum(1 for (flag,) in rows if flag)
+    results['inserted'] += inserted
+    results['updated'] += len(rows) - inserted
+    return len(rows)
+
+
+def import_results(mode: str) -> Dict:
+    """Empty result counters of an import"""
+    results = {
+        'imported': 0,
+        'failed': 0,
+        'errors': []
+    }
+    if mode == 'upsert':
+        results.update({'inserted': 0, 'updated': 0, 'unchanged': 0})
+    return results
+
+
 class CSVImporter:
     """Import data from CSV files"""
     
     def __init__(self, db_connection):
         self.conn = db_connection
     
+    # Rows per chunk read from the file
+    CHUNK_SIZE = 50000
+    
+    # Files up to this size get an exact line count in preview; larger ones are estimated
+    EXACT_COUNT_BYTES = 64 * 1024 * 1024
+    SAMPLE_BYTES = 4 * 1024 * 1024
+    READ_BLOCK_BYTES = 1024 * 1024
+    
+    def count_rows(self, file_path: str) -> Tuple[int, bool]:
+        """
+        Count data rows by counting newline bytes
+        
+        Returns (rows, estimated). Large files are estimated from samples taken
+        at the start, middle and end of the file.
+        """
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            if size <= self.EXACT_COUNT_BYTES:
+                lines = 0
+                last = b''
+                while True:
+                    block = f.read(self.READ_BLOCK_BYTES)
+                    if not block:
+                        break
+                    lines += block.count(b'\n')
+                    last = block
+                # A last line without a trailing newline
+                if last and not last.endswith(b'\n'):
+                    lines += 1
+                return max(lines - 1, 0), False
+            
+            sampled = 0
+            sample_lines = 0
+            for offset in (0, size // 2, size - self.SAMPLE_BYTES):
+                f.seek(max(offset, 0))
+                block = f.read(self.SAMPLE_BYTES)
+                sampled += len(block)
+                sample_lines += block.count(b'\n')
+            return max(int(size * sample_lines / sampled) - 1, 0), True
+    
     def preview(self, file_path: str, encoding: str = 'utf-8') -> Dict:
         """Preview CSV file structure"""
         try:
             df = pd.read_csv(file_path, nrows=5, encoding=encoding)
+            total_rows, estimated = self.count_rows(file_path)
             return {
                 'columns': list(df.columns),
                 'sample': df.to_dict('records'),
-                'total_rows': sum(1 for _ in open(file_path, encoding=encoding)) - 1
+                'total_rows': total_rows,
+                'total_rows_estimated': estimated
             }
         except Exception as e:
             return {'error': str(e)}
     
+    # Target tables of CSV imports
+    TABLE_CONFIG = {
+        'wells': {'table': 'wells', 'geom_type': 'POINT', 'required': ['number']},
+        'marker_posts': {'table': 'marker_posts', 'geom_type': 'POINT', 'required': ['number']},
+        'channel_directions': {'table': 'channel_directions', 'geom_type': 'LINESTRING', 'required': ['number']},
+        'ground_cables': {'table': 'ground_cables', 'geom_type': 'LINESTRING', 'required': ['number']},
+        'aerial_cables': {'table': 'aerial_cables', 'geom_type': 'LINESTRING', 'required': ['number']},
+        'duct_cables': {'table': 'duct_cables', 'geom_type': 'LINESTRING', 'required': ['number']}
+    }
+    
+    # Columns that are never taken from the file
+    PROTECTED_COLUMNS = {'id', 'geom_wgs84', 'geom_msk86', 'created_by', 'updated_by', 'import_key', 'import_hash'}
+    
+    STAGING_TABLE = 'csv_import_staging'
+    
+    # Staged and checked in pandas with their own type; integer bounds are exclusive
+    INTEGER_RANGES = {'smallint': 2 ** 15, 'integer': 2 ** 31, 'bigint': 2 ** 63}
+    FLOAT_TYPES = ('numeric', 'double precision', 'real')
+    TEXT_TYPES = ('character varying', 'character', 'text')
+    REAL_MAX = 3.4028234e38
+    
+    # lat/lon columns of the staging table
+    COORDINATE_COLUMN = {'type': 'double precision', 'udt': 'float8', 'max_length': None, 'precision': None, 'scale': None}
+    
+    def _target_columns(self, cur, table: str) -> Dict[str, Dict]:
+        """Column name -> {type, udt, max_length, precision, scale} of a table"""
+        cur.execute("""
+            SELECT column_name, data_type, udt_name, character_maximum_length, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+        """, (table,))
+        return {
+            name: {'type': data_type, 'udt': udt, 'max_length': max_length, 'precision': precision, 'scale': scale}
+            for name, data_type, udt, max_length, precision, scale in cur.fetchall()
+        }
+    
+    def _checked_in_pandas(self, column: Dict) -> bool:
+        """
+        Whether a column's values are fully validated by _coerce_column
+        
+        Other columns are staged as text and cast on insert, where a value
+        PostgreSQL rejects fails only its own row instead of the whole COPY.
+        """
+        data_type = column['type']
+        return (data_type in self.INTEGER_RANGES or data_type in self.FLOAT_TYPES or data_type in self.TEXT_TYPES
+                or data_type in ('boolean', 'date') or data_type.startswith('timestamp'))
+    
+    def _foreign_keys(self, cur, table: str) -> Dict[str, Tuple[str, str]]:
+        """Single-column foreign keys of a table: column -> (referenced table, referenced column)"""
+        cur.execute("""
+            SELECT a.attname, rc.relname, ra.attname
+            FROM pg_constraint c
+            JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+            JOIN pg_class rc ON rc.oid = c.confrelid
+            JOIN pg_attribute ra ON ra.attrelid = c.confrelid AND ra.attnum = c.confkey[1]
+            WHERE c.conrelid = %s::regclass AND c.contype = 'f' AND array_length(c.conkey, 1) = 1
+        """, (table,))
+        return {column: (ref_table, ref_column) for column, ref_table, ref_column in cur.fetchall()}
+    
+    def _coerce_column(self, series: pd.Series, column: Dict) -> Tuple[pd.Series, pd.Series]:
+        """
+        Convert a column to the target type
+        
+        Returns (converted values, mask of rows whose value could not be
+        converted or is out of the column's range).
+        """
+        present = series.notna()
+        data_type = column['type'] if self._checked_in_pandas(column) else 'text'
+        if data_type in self.INTEGER_RANGES:
+            numbers = pd.to_numeric(series, errors='coerce')
+            bound = self.INTEGER_RANGES[data_type]
+            bad = present & ~((numbers % 1 == 0) & (numbers >= -bound) & (numbers < bound))
+            return numbers.where(~bad).astype('Int64'), bad
+        if data_type in self.FLOAT_TYPES:
+            numbers = pd.to_numeric(series, errors='coerce')
+            bad = numbers.isna()
+            if data_type == 'real':
+                bad |= numbers.abs() > self.REAL_MAX
+            elif data_type == 'numeric':
+                bad |= numbers.abs() == float('inf')
+                if column['precision'] is not None:
+                    scale = column['scale'] or 0
+                    bad |= numbers.round(scale).abs() >= 10 ** (column['precision'] - scale)
+            bad &= present
+            return numbers.where(~bad), bad
+        if data_type == 'date' or data_type.startswith('timestamp'):
+            try:
+                dates = pd.to_datetime(series, errors='coerce')
+            except (ValueError, TypeError):
+                # Mixed UTC offsets
+                dates = pd.to_datetime(series, errors='coerce', utc=True)
+            return dates, present & dates.isna()
+        if data_type == 'boolean':
+            flags = series.map(lambda v: str(v).strip().lower() in ('1', 't', 'true', 'y', 'yes', 'да'), na_action='ignore')
+            return flags, pd.Series(False, index=series.index)
+        # PostgreSQL text cannot hold NUL characters
+        bad = present & series.str.contains('\x00', regex=False)
+        if column['max_length']:
+            bad |= present & series.str.len().gt(column['max_length'])
+        return series, bad
+    
+    def _stage_chunk(self, cur, chunk: pd.DataFrame, columns: Dict[str, str], data_columns: List[str],
+                     target_columns: Dict[str, Dict], row_errors: Dict[int, List[str]]):
+        """Convert a chunk of rows column by column and COPY the valid ones into the staging table"""
+        # Row numbers as reported to the user
+        staging = pd.DataFrame({'row_num': chunk.index + 1}, index=chunk.index)
+        invalid = pd.Series(False, index=chunk.index)
+        
+        for db_col in ['lat', 'lon'] + data_columns:
+            if db_col not in columns:
+                staging[db_col] = None
+                continue
+            source = chunk[columns[db_col]]
+            column = self.COORDINATE_COLUMN if db_col in ('lat', 'lon') else target_columns[db_col]
+            values, bad = self._coerce_column(source, column)
+            staging[db_col] = values
+            invalid |= bad
+            for idx, value in source[bad].items():
+                row_errors.setdefault(idx + 1, []).append(f"Invalid value for {db_col}: {value}")
+        
+        buffer = io.StringIO()
+        staging[~invalid].to_csv(buffer, header=False, index=False, na_rep='')
+        buffer.seek(0)
+        cur.copy_expert(
+            f"COPY {self.STAGING_TABLE} ({', '.join(staging.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    
     def import_data(self, file_path: str, object_type: str, mapping: Dict[str, str], 
-                    user_id: int, encoding: str = 'utf-8') -> Dict:
+                    user_id: int, encoding: str = 'utf-8', chunk_size: int = CHUNK_SIZE,
+                    mode: str = 'insert') -> Dict:
         """
         Import CSV data into database
         
+        The file is read in chunks of chunk_size rows; mapped columns are
+        converted per column and streamed into a temporary staging table with
+        COPY, so memory use does not grow with the file. Rows are then
+        validated with set-based queries and moved to the target table with
+        INSERT ... SELECT over row_num ranges; a range that fails is bisected
+        down to the offending rows, which are reported and skipped.
+        
         Args:
             file_path: Path to CSV file
             object_type: Target table (wells, marker_posts, etc.)
             mapping: Dict mapping CSV columns to DB columns
             user_id: ID of user performing import
             encoding: File encoding
+            chunk_size: Rows read from the file at a time
+            mode: 'insert', or 'upsert' to update objects matched on number and owner_id
             
         Returns:
             Dict with import results
         """
-        results = {
-            'imported': 0,
-            'failed': 0,
-            'errors': []
-        }
+        if mode not in IMPORT_MODES:
+            return {'error': f'Unknown import mode: {mode}'}
+        results = import_results(mode)
+        
+        config = self.TABLE_CONFIG.get(object_type)
+        if not config:
+            return {'error': f'Unknown object type: {object_type}'}
+        table = config['table']
         
         try:
-            df = pd.read_csv(file_path, encoding=encoding)
             cur = self.conn.cursor()
+            target_columns = self._target_columns(cur, table)
+            foreign_keys = self._foreign_keys(cur, table)
+            header = pd.read_csv(file_path, encoding=encoding, nrows=0).columns
             
-            # Table configuration
-            table_config = {
-                'wells': {
-                    'table': 'wells',
-                    'geom_type': 'POINT',
-                    'required': ['number']
-                },
-                'marker_posts': {
-                    'table': 'marker_posts',
-                    'geom_type': 'POINT',
-                    'required': ['number']
-                },
-                'channel_directions': {
-                    'table': 'channel_directions',
-                    'geom_type': 'LINESTRING',
-                    'required': ['number']
-                },
-                'ground_cables': {
-                    'table': 'ground_cables',
-                    'geom_type': 'LINESTRING',
-                    'required': ['number']
-                },
-                'aerial_cables': {
-                    'table': 'aerial_cables',
-                    'geom_type': 'LINESTRING',
-                    'required': ['number']
-                },
-                'duct_cables': {
-                    'table': 'duct_cables',
-                    'geom_type': 'LINESTRING',
-                    'required': ['number']
-                }
-            }
+            # CSV column -> DB column; lat/lon build the geometry
+            columns = {}
+            for csv_col, db_col in mapping.items():
+                if csv_col not in header:
+                    continue
+                if db_col not in ('lat', 'lon') and (db_col not in target_columns or db_col in self.PROTECTED_COLUMNS):
+                    cur.close()
+                    return {'error': f'Unknown column: {db_col}'}
+                columns[db_col] = csv_col
             
-            config = table_config.get(object_type)
-            if not config:
-                return {'error': f'Unknown object type: {object_type}'}
+            data_columns = [c for c in columns if c not in ('lat', 'lon')]
+            if mode == 'upsert':
+                missing = [c for c in _UPSERT_KEY if c not in data_columns]
+                if missing:
+                    cur.close()
+                    return {'error': f"Key columns not imported: {', '.join(missing)}"}
+            row_errors: Dict[int, List[str]] = {}
             
-            for idx, row in df.iterrows():
-                try:
-                    # Build data from mapping
-                    data = {}
-                    lat = None
-                    lon = None
-                    
-                    for csv_col, db_col in mapping.items():
-                        if csv_col in row and pd.notna(row[csv_col]):
-                            value = row[csv_col]
-                            if db_col == 'lat':
-                                lat = float(value)
-                            elif db_col == 'lon':
-                                lon = float(value)
-                            else:
-                                data[db_col] = value
-                    
-                    # Check required fields
-                    missing = [f for f in config['required'] if f not in data]
-                    if missing:
-                        results['errors'].append(f"Row {idx+1}: Missing required fields: {missing}")
-                        results['failed'] += 1
-                        continue
-                    
-                    # Build insert query
-                    fields = ['created_by', 'updated_by']
-                    values = [user_id, user_id]
-                    placeholders = ['%s', '%s']
-                    
-                    for field, value in data.items():
-                        fields.append(field)
-                        values.append(value)
-                        placeholders.append('%s')
-                    
-                    # Add geometry
-                    if lat is not None and lon is not None:
-                        fields.append('geom_wgs84')
-                        values.append(f'SRID=4326;POINT({lon} {lat})')
-                        placeholders.append('ST_GeomFromEWKT(%s)')
-                    
-                    query = f"""
-                        INSERT INTO {config['table']} ({', '.join(fields)})
-                        VALUES ({', '.join(placeholders)})
-                    """
-                    
-                    cur.execute(query, values)
-                    results['imported'] += 1
-                    
-                except Exception as e:
-                    results['errors'].append(f"Row {idx+1}: {str(e)}")
-                    results['failed'] += 1
+            # Staging table with the target's column types; columns not fully
+            # checked in pandas are staged as text and cast on insert
+            text_staged = [c for c in data_columns if not self._checked_in_pandas(target_columns[c])]
+            column_defs = ', '.join(
+                f"{c} {'double precision' if c in ('lat', 'lon') else 'text' if c in text_staged else target_columns[c]['type']}"
+                for c in ['lat', 'lon'] + data_columns
+            )
+            cur.execute(f"""
+                CREATE TEMP TABLE {self.STAGING_TABLE} (row_num integer PRIMARY KEY, {column_defs})
+                ON COMMIT DROP
+            """)
+            
+            # Values are read as text and converted per target column
+            for chunk in pd.read_csv(file_path, encoding=encoding, dtype=str, chunksize=chunk_size):
+                self._stage_chunk(cur, chunk, columns, data_columns, target_columns, row_errors)
+            
+            # Set-based validation: (condition, message) pairs evaluated over the staging table
+            checks = [
+                ('TRUE' if f not in data_columns else f"s.{f} IS NULL", f"'Missing required field: {f}'")
+                for f in config['required']
+            ]
+            checks.append(("(s.lat IS NULL) <> (s.lon IS NULL)", "'Both lat and lon are required for coordinates'"))
+            checks.append(("s.lat NOT BETWEEN -90 AND 90 OR s.lon NOT BETWEEN -180 AND 180",
+                           "'Coordinates out of range: ' || s.lat || ', ' || s.lon"))
+            if config['geom_type'] != 'POINT':
+                checks.append(("s.lat IS NOT NULL AND s.lon IS NOT NULL",
+                               f"'Point coordinates cannot be imported into {table}'"))
+            for column, (ref_table, ref_column) in foreign_keys.items():
+                if column in data_columns:
+                    # Text-staged values are compared as text, so a malformed one is "not found"
+                    ref_value = f"r.{ref_column}::text" if column in text_staged else f"r.{ref_column}"
+                    checks.append((f"s.{column} IS NOT NULL AND NOT EXISTS "
+                                   f"(SELECT 1 FROM {ref_table} r WHERE {ref_value} = s.{column})",
+                                   f"'{column} ' || s.{column} || ' not found in {ref_table}'"))
+            
+            cur.execute(f"""
+                SELECT row_num, problems FROM (
+                    SELECT s.row_num, array_remove(ARRAY[
+                        {', '.join(f"CASE WHEN {condition} THEN {message} END" for condition, message in checks)}
+                    ], NULL) as problems
+                    FROM {self.STAGING_TABLE} s
+                ) v
+                WHERE cardinality(problems) > 0
+            """)
+            for row_num, problems in cur.fetchall():
+                row_errors.setdefault(row_num, []).extend(problems)
+            
+            if row_errors:
+                cur.execute(f"DELETE FROM {self.STAGING_TABLE} WHERE row_num = ANY(%s)", (list(row_errors),))
+            
+            geometry = ("CASE WHEN s.lat IS NOT NULL AND s.lon IS NOT NULL "
+                        "THEN ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326) END")
+            insert_columns = ['created_by', 'updated_by'] + data_columns + ['geom_wgs84']
+            select_values = [
+                f"s.{c}::{target_columns[c]['udt']}" if c in text_staged else f's.{c}' for c in data_columns
+            ] + [geometry]
+            upsert = ''
+            if mode == 'upsert':
+                insert_columns += ['import_key', 'import_hash']
+                select_values += [
+                    f"'{KEYED}'",
+                    f"md5(jsonb_build_array({', '.join(f's.{c}' for c in ['lat', 'lon'] + data_columns)})::text)"
+                ]
+                upsert = upsert_clause(table, data_columns, geometry='lat' in columns)
+                adopt = adopt_query(table, f"""
+                    SELECT object_import_key(s.number, s.owner_id) FROM {self.STAGING_TABLE} s
+                    WHERE s.row_num BETWEEN %s AND %s
+                """)
+            insert_query = f"""
+                INSERT INTO {table} ({', '.join(insert_columns)})
+                SELECT %s, %s, {', '.join(select_values)}
+                FROM {self.STAGING_TABLE} s
+                WHERE s.row_num BETWEEN %s AND %s
+                ORDER BY s.row_num
+                {upsert}
+            """
+            
+            def insert_rows(row_nums):
+                if mode == 'upsert':
+                    cur.execute(adopt, (row_nums[0], row_nums[-1]))
+                cur.execute(insert_query, (user_id, user_id, row_nums[0], row_nums[-1]))
+                if mode == 'upsert':
+                    return count_upserted(cur.fetchall(), results)
+                return cur.rowcount
+            
+            cur.execute(f"SELECT count(*), coalesce(max(row_num), 0) FROM {self.STAGING_TABLE}")
+            staged, last_row = cur.fetchone()
+            results['imported'], failures = insert_isolated(cur, range(1, last_row + 1), insert_rows, chunk_size)
+            for row_num, error in failures:
+                row_errors.setdefault(row_num, []).append(error)
+            if mode == 'upsert':
+                results['unchanged'] = staged - results['imported'] - len(failures)
             
             self.conn.commit()
             cur.close()
             
+            for row_num in sorted(row_errors):
+                results['errors'].append(f"Row {row_num}: {'; '.join(row_errors[row_num])}")
+            results['failed'] = len(row_errors)
+            
         except Exception as e:
+            self.conn.rollback()
+            results = import_results(mode)
             results['error'] = str(e)
         
         return results
@@ -324,7 +672,7 @@ class MapInfoImporter:
         return geometries
     
     def import_from_tab(self, tab_path: str, object_type: str, mapping: Dict[str, str],
-                        user_id: int, source_srid: int = 4326) -> Dict:
+                        user_id: int, source_srid: int = 4326, mode: str = 'insert') -> Dict:
         """
         Import MapInfo TAB file set into database
         
@@ -334,13 +682,12 @@ class MapInfoImporter:
             mapping: Column mapping
             user_id: Importing user ID
             source_srid: Source coordinate system SRID
+            mode: 'insert', or 'upsert' to update objects matched on number and owner_id
         """
-        results = {
-            'imported': 0,
-            'failed': 0,
-            'errors': [],
-            'warnings': []
-        }
+        if mode not in IMPORT_MODES:
+            return {'error': f'Unknown import mode: {mode}'}
+        results = import_results(mode)
+        results['warnings'] = []
         
         # Get base path
         base_path = os.path.splitext(tab_path)[0]
@@ -390,41 +737,60 @@ class MapInfoImporter:
                 results['error'] = f'Unknown object type: {object_type}'
                 return results
             
+            rows = []
             for idx, record in enumerate(records):
-                try:
-                    data = {}
-                    for src_col, dst_col in mapping.items():
-                        if src_col in record and record[src_col] is not None:
-                            data[dst_col] = record[src_col]
-                    
-                    if 'number' not in data:
-                        data['number'] = f'IMP-{idx+1}'
-                    
-                    fields = ['created_by', 'updated_by']
-                    values = [user_id, user_id]
-                    
-                    for field, value in data.items():
-                        fields.append(field)
-                        values.append(value)
-                    
-                    placeholders = ['%s'] * len(values)
-                    
-                    query = f"""
-                        INSERT INTO {table} ({', '.join(fields)})
-                        VALUES ({', '.join(placeholders)})
-                    """
-                    
-                    cur.execute(query, values)
-                    results['imported'] += 1
-                    
-                except Exception as e:
-                    results['errors'].append(f"Record {idx+1}: {str(e)}")
-                    results['failed'] += 1
+                data = {}
+                for src_col, dst_col in mapping.items():
+                    if src_col in record and record[src_col] is not None:
+                        data[dst_col] = record[src_col]
+                
+                if 'number' not in data:
+                    data['number'] = f'IMP-{idx+1}'
+                
+                rows.append((idx + 1, data))
+            
+            # Records may set different columns; unset ones take the column default
+            fields = list(dict.fromkeys(field for _, data in rows for field in data))
+            insert_columns = ['created_by', 'updated_by'] + fields
+            upsert = ''
+            if mode == 'upsert':
+                missing = [c for c in _UPSERT_KEY if c not in fields]
+                if missing:
+                    cur.close()
+                    results['error'] = f"Key columns not imported: {', '.join(missing)}"
+                    return results
+                insert_columns += ['import_key', 'import_hash']
+                upsert = upsert_clause(table, fields)
+            query = f"INSERT INTO {table} ({', '.join(insert_columns)}) VALUES %s {upsert}"
+            
+            def insert_rows(batch):
+                values = []
+                for _, data in batch:
+                    row = [user_id, user_id] + [data.get(field, DEFAULT) for field in fields]
+                    if mode == 'upsert':
+                        row += [KEYED, content_hash(data)]
+                    values.append(tuple(row))
+                if mode == 'upsert':
+                    adopt_record_keys(cur, table, [data for _, data in batch])
+                    return count_upserted(execute_values(cur, query, values, page_size=len(values), fetch=True), results)
+                execute_values(cur, query, values, page_size=len(values))
+                return len(values)
+            
+            results['imported'], failures = insert_isolated(cur, rows, insert_rows)
+            for (idx, _), error in failures:
+                results['errors'].append(f"Record {idx}: {error}")
+            results['failed'] = len(failures)
+            if mode == 'upsert':
+                results['unchanged'] = len(rows) - results['imported'] - len(failures)
             
             self.conn.commit()
             cur.close()
             
         except Exception as e:
+            self.conn.rollback()
+            warnings = results['warnings']
+            results = import_results(mode)
+            results['warnings'] = warnings
             results['error'] = str(e)
         
         return results
@@ -437,13 +803,16 @@ class GeoJSONImporter:
         self.conn = db_connection
     
     def import_from_geojson(self, file_path: str, object_type: str, 
-                            mapping: Dict[str, str], user_id: int) -> Dict:
-        """Import GeoJSON file into database"""
-        results = {
-            'imported': 0,
-            'failed': 0,
-            'errors': []
-        }
+                            mapping: Dict[str, str], user_id: int, mode: str = 'insert') -> Dict:
+        """
+        Import GeoJSON file into database
+        
+        With mode='upsert' features are matched to existing objects on
+        number and owner_id; unchanged features are skipped.
+        """
+        if mode not in IMPORT_MODES:
+            return {'error': f'Unknown import mode: {mode}'}
+        results = import_results(mode)
         
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -466,52 +835,68 @@ class GeoJSONImporter:
                 results['error'] = f'Unknown object type: {object_type}'
                 return results
             
+            rows = []
             for idx, feature in enumerate(features):
-                try:
-                    props = feature.get('properties', {})
-                    geom = feature.get('geometry')
-                    
-                    # Map properties
-                    data = {}
-                    for src_col, dst_col in mapping.items():
-                        if src_col in props and props[src_col] is not None:
-                            data[dst_col] = props[src_col]
-                    
-                    if 'number' not in data:
-                        data['number'] = f'GEO-{idx+1}'
-                    
-                    fields = ['created_by', 'updated_by']
-                    values = [user_id, user_id]
-                    placeholders = ['%s', '%s']
-                    
-                    for field, value in data.items():
-                        fields.append(field)
-                        values.append(value)
-                        placeholders.append('%s')
-                    
-                    # Add geometry
-                    if geom:
-                        geom_json = json.dumps(geom)
-                        fields.append('geom_wgs84')
-                        values.append(geom_json)
-                        placeholders.append('ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)')
-                    
-                    query = f"""
-                        INSERT INTO {table} ({', '.join(fields)})
-                        VALUES ({', '.join(placeholders)})
-                    """
-                    
-                    cur.execute(query, values)
-                    results['imported'] += 1
-                    
-                except Exception as e:
-                    results['errors'].append(f"Feature {idx+1}: {str(e)}")
-                    results['failed'] += 1
+                props = feature.get('properties') or {}
+                geom = feature.get('geometry')
+                
+                # Map properties
+                data = {}
+                for src_col, dst_col in mapping.items():
+                    if src_col in props and props[src_col] is not None:
+                        data[dst_col] = props[src_col]
+                
+                if 'number' not in data:
+                    data['number'] = f'GEO-{idx+1}'
+                
+                rows.append((idx + 1, data, json.dumps(geom) if geom else None))
+            
+            # Features may set different properties; unset ones take the column default
+            fields = list(dict.fromkeys(field for _, data, _ in rows for field in data))
+            insert_columns = ['created_by', 'updated_by'] + fields
+            upsert = ''
+            if mode == 'upsert':
+                missing = [c for c in _UPSERT_KEY if c not in fields]
+                if missing:
+                    cur.close()
+                    results['error'] = f"Key columns not imported: {', '.join(missing)}"
+                    return results
+                insert_columns += ['import_key', 'import_hash']
+                upsert = upsert_clause(table, fields, geometry=True)
+            query = f"""
+                INSERT INTO {table} ({', '.join(insert_columns + ['geom_wgs84'])})
+                VALUES %s
+                {upsert}
+            """
+            template = f"({', '.join(['%s'] * len(insert_columns))}, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326))"
+            
+            def insert_rows(batch):
+                values = []
+                for _, data, geom_json in batch:
+                    row = [user_id, user_id] + [data.get(field, DEFAULT) for field in fields]
+                    if mode == 'upsert':
+                        row += [KEYED, content_hash([data, geom_json])]
+                    values.append(tuple(row + [geom_json]))
+                if mode == 'upsert':
+                    adopt_record_keys(cur, table, [data for _, data, _ in batch])
+                    return count_upserted(execute_values(cur, query, values, template=template,
+                                                         page_size=len(values), fetch=True), results)
+                execute_values(cur, query, values, template=template, page_size=len(values))
+                return len(values)
+            
+            results['imported'], failures = insert_isolated(cur, rows, insert_rows)
+            for (idx, _, _), error in failures:
+                results['errors'].append(f"Feature {idx}: {error}")
+            results['failed'] = len(failures)
+            if mode == 'upsert':
+                results['unchanged'] = len(rows) - results['imported'] - len(failures)
             
             self.conn.commit()
             cur.close()
             
         except Exception as e:
+            self.conn.rollback()
+            results = import_results(mode)
             results['error'] = str(e)
         
         return results
@@ -0,0 +1,179 @@
+"""
+ИГС Portal - Duct Network Graph
+In-memory index of cable duct directions between wells for route tracing
+"""
+
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class DuctNetwork:
+    """
+    Undirected graph of wells (nodes) joined by channel directions (edges)
+
+    Adjacency lists are keyed by well id. Each direction carries its length
+    in metres and the number of occupied / total channels, so routes can be
+    planned by length or by occupancy without touching the database.
+    Callers hold `lock` while updating or querying from several threads.
+    """
+
+    SHORTEST = 'shortest'
+    LEAST_OCCUPIED = 'least_occupied'
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.adjacency: Dict[int, List[Tuple[int, int]]] = {}  # well -> [(neighbour well, direction)]
+        self.directions: Dict[int, Tuple[int, int, float]] = {}  # direction -> (start well, end well, length)
+        self.occupancy: Dict[int, Tuple[int, int]] = {}  # direction -> (occupied, total channels)
+        self.cable_directions: Dict[int, Set[int]] = {}  # duct cable -> directions it runs through
+        self.versions: Dict[str, int] = {}
+        self.watermark: Optional[int] = None
+
+    # ---------- updates ----------
+
+    def clear(self):
+        """Drop all directions, occupancy and cable routes"""
+        self.adjacency.clear()
+        self.directions.clear()
+        self.occupancy.clear()
+        self.cable_directions.clear()
+        self.versions.clear()
+        self.watermark = None
+
+    def set_direction(self, direction_id: int, start_well: Optional[int],
+                      end_well: Optional[int], length: Optional[float]):
+        """Add or replace a direction; directions missing a well are not routable"""
+        self.remove_direction(direction_id)
+        if start_well is None or end_well is None:
+            return
+        self.directions[direction_id] = (start_well, end_well, length or 0.0)
+        self.adjacency.setdefault(start_well, []).append((end_well, direction_id))
+        self.adjacency.setdefault(end_well, []).append((start_well, direction_id))
+
+    def remove_direction(self, direction_id: int):
+        """Remove a direction if present"""
+        edge = self.directions.pop(direction_id, None)
+        if edge is None:
+            return
+        for well in set(edge[:2]):
+            neighbours = [n for n in self.adjacency.get(well, []) if n[1] != direction_id]
+            if neighbours:
+                self.adjacency[well] = neighbours
+            else:
+                self.adjacency.pop(well, None)
+
+    def set_occupancy(self, occupancy: Dict[int, Tuple[int, int]],
+                      cable_directions: Dict[int, Set[int]]):
+        """Replace channel occupancy per direction and the directions of each cable"""
+        self.occupancy = occupancy
+        self.cable_directions = cable_directions
+
+    # ---------- queries ----------
+
+    def fill_ratio(self, direction_id: int) -> float:
+        """Share of occupied channels in a direction (0 when it has no channels)"""
+        occupied, total = self.occupancy.get(direction_id, (0, 0))
+        return occupied / total if total else 0.0
+
+    def is_full(self, direction_id: int) -> bool:
+        """Whether every channel of a direction is occupied"""
+        occupied, total = self.occupancy.get(direction_id, (0, 0))
+        return total > 0 and occupied >= total
+
+    def route(self, from_well: int, to_well: int, mode: str = SHORTEST) -> Optional[Dict]:
+        """
+        Find a path between two wells (Dijkstra)
+
+        `shortest` minimises length. `least_occupied` skips full directions and
+        minimises the summed fill ratio, then length. Returns None when the
+        wells are not connected.
+        """
+        if from_well not in self.adjacency or to_well not in self.adjacency:
+            return None
+
+        start_cost = (0.0, 0.0)
+        best = {from_well: start_cost}
+        previous: Dict[int, Tuple[int, int]] = {}
+        queue = [(start_cost, from_well)]
+
+        while queue:
+            cost, well = heapq.heappop(queue)
+            if well == to_well:
+                break
+            if cost > best.get(well, cost):
+                continue
+            for neighbour, direction_id in self.adjacency[well]:
+                length = self.directions[direction_id][2]
+                if mode == self.LEAST_OCCUPIED:
+                    if self.is_full(direction_id):
+                        continue
+                    new_cost = (cost[0] + self.fill_ratio(direction_id), cost[1] + length)
+                else:
+                    new_cost = (cost[0] + length, 0.0)
+                if neighbour not in best or new_cost < best[neighbour]:
+                    best[neighbour] = new_cost
+                    previous[neighbour] = (well, direction_id)
+                    heapq.heappush(queue, (new_cost, neighbour))
+
+        if to_well not in best:
+            return None
+
+        wells = [to_well]
+        directions = []
+        while wells[-1] != from_well:
+            well, direction_id = previous[wells[-1]]
+            wells.append(well)
+            directions.append(direction_id)
+        wells.reverse()
+        directions.reverse()
+
+        return {
+            'wells': wells,
+            'directions': directions,
+            'length': sum(self.directions[d][2] for d in directions),
+            'max_fill_ratio': max((self.fill_ratio(d) for d in directions), default=0.0)
+        }
+
+    def chain(self, direction_ids: Iterable[int]) -> List[Dict]:
+        """
+        Order a set of directions into continuous well-to-well segments
+
+        A cable normally yields one segment; gaps or branches in its channel
+        assignments yield several.
+        """
+        remaining = {d for d in direction_ids if d in self.directions}
+        degree: Dict[int, int] = {}
+        for direction_id in remaining:
+            for well in self.directions[direction_id][:2]:
+                degree[well] = degree.get(well, 0) + 1
+
+        segments = []
+        while remaining:
+            # Start from a loose end when there is one
+            wells_left = {w for d in remaining for w in self.directions[d][:2]}
+            start = min(wells_left, key=lambda w: (degree[w] != 1, w))
+            wells = [start]
+            directions = []
+            while True:
+                step = next(((n, d) for n, d in self.adjacency.get(wells[-1], []) if d in remaining), None)
+                if step is None:
+                    break
+                remaining.discard(step[1])
+                directions.append(step[1])
+                wells.append(step[0])
+            segments.append({
+                'wells': wells,
+                'directions': directions,
+                'length': sum(self.directions[d][2] for d in directions)
+            })
+        return segments
+
+    def stats(self) -> Dict:
+        """Return graph size counters"""
+        return {
+            'wells': len(self.adjacency),
+            'directions': len(self.directions),
+            'cables': len(self.cable_directions),
+            'watermark': self.watermark
+        }
@@ -296,7 +296,15 @@ async function submitCSVImport(event) {
         const result = await response.json();
         
         if (response.ok) {
-            showNotification(`Импортировано: ${result.imported} из ${result.total}`, 'success');
+            if (result.error) {
+                showNotification(result.error, 'error');
+                return;
+            }
+            if (result.unchanged !== undefined) {
+                showNotification(`Добавлено: ${result.inserted}, обновлено: ${result.updated}, без изменений: ${result.unchanged}, ошибок: ${result.failed}`, 'success');
+            } else {
+                showNotification(`Импортировано: ${result.imported}, ошибок: ${result.failed}`, 'success');
+            }
             closeModal('import-modal');
             
             // Reload data